@@ -44,16 +44,25 @@ from main import SafeLabel
 # --- Standard library ---
 import os
 import csv
+import json
 import tracemalloc
+import queue
+import random
+import statistics
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
 from collections import defaultdict
+from urllib.request import pathname2url
 
 import sqlite3
 from db_builder import build_database
 
-from postcode_lookup import lookup_postcode as compact_lookup
-from postcode_lookup import load_all_postcode_data
-from postcode_lookup import all_postcodes
+from postcode_lookup import LRUCache, PostcodeLoader
+from postcode_lookup import brma_name_map, complete_from, normalise_postcode, pack_postcode, suggest_from
+from postcode_lookup import INDEX_FORMATS, available_index_format, compact_available, estimated_memory, find_packaged
 
 # ============================================================
 # START MEMORY TRACING
@@ -1288,6 +1297,12 @@ def with_diagnostics(widget_names=None):
                 else:
                     print(f"  ✔ {name}: OK")
 
+            # Lookups happen on the screens, so report the cache as it
+            # stands on each one rather than only at startup
+            app = App.get_running_app()
+            if app is not None and hasattr(app, "postcode_cache"):
+                print(f"  {app.postcode_cache_stats()}")
+
             print(f"=== End Diagnostics for {cls.__name__} ===\n")
 
         setattr(cls, "on_pre_enter", new_on_pre_enter)
@@ -3048,6 +3063,63 @@ class CalculatorHousingScreen(BaseScreen):
         )
         layout.add_widget(w["postcode"])
 
+        # Completions (or near misses for a typo) shown under the postcode
+        # as it is typed; the search runs off the main thread
+        postcode_dropdown = DropDown(auto_width=False)
+        postcode_dropdown.bind(on_select=lambda inst, value: setattr(w["postcode"], "text", value))
+        pending_search = [None]
+
+        def show_postcode_suggestions(text, matches):
+            # Typing has moved on since this search started
+            if w["postcode"].text != text:
+                return
+
+            typed = normalise_postcode(text)
+            matches = [m for m in matches if m != typed]
+            postcode_dropdown.clear_widgets()
+            if not matches or not w["postcode"].focus:
+                postcode_dropdown.dismiss()
+                return
+
+            for m in matches:
+                btn = Button(
+                    text=m,
+                    size_hint_y=None,
+                    height=44,
+                    background_normal="",
+                    background_color=get_color_from_hex("#FFFFFF"),
+                    color=get_color_from_hex("#005EA5")
+                )
+                btn.bind(on_release=lambda inst: postcode_dropdown.select(inst.text))
+                postcode_dropdown.add_widget(btn)
+
+            postcode_dropdown.width = w["postcode"].width
+            if postcode_dropdown.attach_to is None:
+                postcode_dropdown.open(w["postcode"])
+
+        def search_postcodes(text):
+            try:
+                matches = App.get_running_app().postcode_suggestions(text)
+            except Exception as e:
+                print("Postcode suggestion error:", e)
+                matches = []
+            Clock.schedule_once(lambda dt: show_postcode_suggestions(text, matches), 0)
+
+        def on_postcode_text(instance, text):
+            if pending_search[0] is not None:
+                pending_search[0].cancel()
+            if len(text.strip()) < 2:
+                postcode_dropdown.dismiss()
+                return
+
+            # Wait for a pause in typing rather than searching every key
+            pending_search[0] = Clock.schedule_once(
+                lambda dt: threading.Thread(target=search_postcodes, args=(text,), daemon=True).start(),
+                0.15
+            )
+
+        w["postcode"].bind(text=on_postcode_text)
+
         # ---------------------------------------------------------
         # TENANCY MODE HELPERS
         # ---------------------------------------------------------
@@ -5543,29 +5615,32 @@ class DisclaimerScreen(BaseScreen):
 
     def _background_load_thread(self):
         app = App.get_running_app()
+        # 1) Choose and open the postcode backend (loading on its own thread
+        #    where it has to). Continue does not wait for it: lookups made
+        #    before it finishes are answered by a partial index. A missing
+        #    or bad postcode file must not stop the LHA tables and screens
+        #    loading.
+        try:
+            backend = choose_postcode_backend(cache_dir=get_app_data_path())
+            app.postcode_backend = backend
+            backend.open()
+            backend.warm_up()
+        except Exception as e:
+            print("Postcode backend error:", e)
+            app.postcode_backend.error = e
+
         try:
-            # 1) Load LHA CSVs (20% → 40%)
+            # 2) Load LHA CSVs (20% → 60%)
             self._update_status("Loading LHA files…")
             app.preload_lha_csvs(
-                progress_callback=lambda v: self._update_progress(0.20 + v * 0.20),
+                progress_callback=lambda v: self._update_progress(0.20 + v * 0.40),
                 status_callback=self._update_status
             )
     
-            # 2) Load postcode engine (40% → 80%)
-            from postcode_lookup import all_postcodes
-            if all_postcodes is None:
-                self._update_status("Loading postcode data…")
-                load_all_postcode_data(
-                    progress=lambda v: self._update_progress(0.40 + v * 0.40),
-                    status=self._update_status
-                )
-            else:
-                self._update_progress(0.80)
-    
-            # 3) Preload screens (80% → 100%)
+            # 3) Preload screens (60% → 100%)
             self._update_status("Preparing screens…")
             app.nav.preload_all_screens(
-                lambda v: self._update_progress(0.80 + v * 0.20)
+                lambda v: self._update_progress(0.60 + v * 0.40)
             )
     
         except Exception as e:
@@ -5584,12 +5659,15 @@ class DisclaimerScreen(BaseScreen):
 
     def _run_diagnostics_safe(self, dt):
         app = App.get_running_app()
-        from postcode_lookup import all_postcodes
-    
-        if all_postcodes is not None:
+        backend = app.postcode_backend
+
+        if backend.failed():
+            self.loading_label.text = "Postcode lookup unavailable"
+            app.run_startup_diagnostics()
+        elif backend.ready():
             app.run_startup_diagnostics()
         else:
-            # Retry until postcode data is ready
+            # Retry until postcode data is ready or has failed to load
             Clock.schedule_once(self._run_diagnostics_safe, 0.1)
 
     def _loading_complete(self, dt):
@@ -5597,7 +5675,7 @@ class DisclaimerScreen(BaseScreen):
         self.loading_label.text = "Ready"
         self.continue_button.disabled = False
     
-        # Run diagnostics now that postcode data is loaded
+        # Run diagnostics once postcode data has finished loading
         Clock.schedule_once(self._run_diagnostics_safe, 0)
 
 # Define the main screen for the app
@@ -6261,29 +6339,482 @@ class NavigationManager:
                 print("ERROR in load_state():", e)
 
 class PostcodeDB:
-    def __init__(self, db_path):
+    """
+    Read-only postcode lookups against postcodes.db, as an alternative
+    to the compact files. Handles both layouts db_builder writes (told
+    apart by PRAGMA user_version) and returns the same dicts as
+    postcode_lookup.lookup_postcode.
+
+    The file is opened mode=ro&immutable=1: it never changes once
+    shipped, so SQLite can skip locking and change checks. Connections
+    come from a small pool, one per thread at a time, and each keeps its
+    own prepared-statement cache for the fixed queries below.
+    """
+
+    HASH_SCHEMA = 0
+    PACKED_SCHEMA = 1
+
+    # SQLite's default limit on ? parameters is 999 on older builds. Every
+    # bulk query has exactly this many, padded with a key no row has (-1),
+    # so each connection prepares it once and reuses it from its cache
+    BULK_CHUNK = 500
+    BULK_PACKED_SQL = (
+        "SELECT pcd_key, brma_id, country_id FROM postcodes WHERE pcd_key IN "
+        f"({','.join('?' * BULK_CHUNK)})"
+    )
+    BULK_HASH_SQL = (
+        "SELECT pcd, brma_id, country_id FROM postcodes WHERE pcd_hash IN "
+        f"({','.join('?' * BULK_CHUNK)}) ORDER BY rowid"
+    )
+
+    def __init__(self, db_path, brma_names=None, pool_size=4):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
-        self.cur = self.conn.cursor()
+        self.uri = "file:" + pathname2url(os.path.abspath(db_path)) + "?mode=ro&immutable=1"
+        self.brma_names = brma_names or {}
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+        with self.connection() as conn:
+            self.schema = conn.execute("PRAGMA user_version").fetchone()[0]
+            if self.schema not in (self.HASH_SCHEMA, self.PACKED_SCHEMA):
+                raise ValueError(f"Unsupported postcodes.db schema version {self.schema}")
+            self.brmas = dict(conn.execute("SELECT id, name FROM brma_dict"))
+            self.countries = dict(conn.execute("SELECT id, code FROM country_dict"))
+
+    def _connect(self):
+        # Never used by two threads at once: the pool hands each
+        # connection to one caller at a time
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+    @contextmanager
+    def connection(self):
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    conn = self._connect()
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def make_result(self, pcd, brma_id, country_id):
+        brma = self.brmas[brma_id]
+        return {
+            "postcode": pcd,
+            "brma_code": brma,
+            "brma_name": self.brma_names.get(brma, brma),
+            "country": self.countries[country_id]
+        }
+
+    def lookup(self, postcode):
+        pcd = normalise_postcode(postcode)
+        ids = self.find(pcd)
+        if ids is None:
+            return None
+        return self.make_result(pcd, *ids)
+
+    def find(self, pcd):
+        """(brma_id, country_id) of a normalised postcode, or None."""
+        with self.connection() as conn:
+            if self.schema == self.PACKED_SCHEMA:
+                key = pack_postcode(pcd)
+                if key is None:
+                    return None
+                row = conn.execute(
+                    "SELECT brma_id, country_id FROM postcodes WHERE pcd_key = ?",
+                    (key,)
+                ).fetchone()
+            else:
+                try:
+                    pcd_hash = zlib.crc32(pcd.encode("ascii"))
+                except UnicodeEncodeError:
+                    return None
+                row = conn.execute(
+                    "SELECT brma_id, country_id FROM postcodes WHERE pcd_hash = ? AND pcd = ? "
+                    "ORDER BY rowid LIMIT 1",
+                    (pcd_hash, pcd)
+                ).fetchone()
+        return row
+
+    def _find_chunk(self, conn, pcds):
+        """postcode -> (brma_id, country_id) for the ones in pcds that exist."""
+        found = {}
+        if self.schema == self.PACKED_SCHEMA:
+            keys = {}
+            for pcd in pcds:
+                key = pack_postcode(pcd)
+                if key is not None:
+                    keys[key] = pcd
+            if not keys:
+                return found
+            params = list(keys)
+            rows = conn.execute(self.BULK_PACKED_SQL, params + [-1] * (self.BULK_CHUNK - len(params)))
+            for key, brma_id, country_id in rows:
+                found[keys[key]] = (brma_id, country_id)
+        else:
+            hashes = {zlib.crc32(pcd.encode("ascii")) for pcd in pcds if pcd.isascii()}
+            if not hashes:
+                return found
+            params = list(hashes)
+            rows = conn.execute(self.BULK_HASH_SQL, params + [-1] * (self.BULK_CHUNK - len(params)))
+            wanted = set(pcds)
+            for pcd, brma_id, country_id in rows:
+                # Hash collisions and repeated postcodes: first row wins
+                if pcd in wanted and pcd not in found:
+                    found[pcd] = (brma_id, country_id)
+        return found
+
+    def lookup_many(self, postcodes):
+        """
+        Bulk form of lookup with the same columnar result as
+        postcode_lookup.lookup_postcodes: one query per BULK_CHUNK
+        postcodes rather than one per postcode.
+        """
+        pcds = [normalise_postcode(p) for p in postcodes]
+
+        found = {}
+        with self.connection() as conn:
+            for i in range(0, len(pcds), self.BULK_CHUNK):
+                found.update(self._find_chunk(conn, pcds[i:i + self.BULK_CHUNK]))
+
+        results = {"postcode": pcds, "brma_code": [], "brma_name": [], "country": []}
+        for pcd in pcds:
+            ids = found.get(pcd)
+            result = self.make_result(pcd, *ids) if ids else {}
+            for column in ("brma_code", "brma_name", "country"):
+                results[column].append(result.get(column))
+        return results
+
+    def close(self):
+        # Idle connections only: one in use goes back to the pool when
+        # its lookup finishes. Each closed one frees its pool slot, so a
+        # lookup arriving after close() opens a new one instead of
+        # waiting for a connection that will never be returned
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+# ============================================================
+# POSTCODE BACKENDS
+# ============================================================
+
+# Recent lookup results kept by BenefitBuddy.lookup_postcode, keyed on
+# the normalised postcode
+POSTCODE_CACHE_SIZE = 256
+
+# Looked up by warm_up: one per country, plus a miss
+WARM_UP_POSTCODES = ("SW1A1AA", "EH11YZ", "CF101EP", "ZZ99ZZZ")
+
+class PostcodeBackend:
+    """
+    A source of postcode lookups. BenefitBuddy only talks to the backend
+    choose_postcode_backend picked through these methods, so the compact
+    files, an mmap index format and postcodes.db are interchangeable.
+    """
+
+    name = None
+    # What stopped the backend opening, set by whoever called open()
+    error = None
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def open(self):
+        """Start loading. Lookups may be answered before loading finishes."""
+
+    def ready(self):
+        """True once the data is fully loaded."""
+        return True
+
+    def load_error(self):
+        """The exception that stopped loading, or None."""
+        return self.error
+
+    def failed(self):
+        """True if loading stopped with an error; the backend will not become ready."""
+        return self.load_error() is not None
 
     def lookup(self, postcode):
-        pc = postcode.replace(" ", "").upper()
+        """A dict as postcode_lookup.lookup_postcode returns, or None."""
+        raise NotImplementedError
 
-        row = self.cur.execute(
-            "SELECT brma, brma_name FROM postcodes WHERE postcode = ?",
-            (pc,)
-        ).fetchone()
+    def lookup_many(self, postcodes):
+        """Columnar results as postcode_lookup.lookup_postcodes returns."""
+        results = {"postcode": [], "brma_code": [], "brma_name": [], "country": []}
+        for postcode in postcodes:
+            result = self.lookup(postcode) or {}
+            results["postcode"].append(normalise_postcode(postcode))
+            for column in ("brma_code", "brma_name", "country"):
+                results[column].append(result.get(column))
+        return results
 
-        if not row:
+    def complete(self, prefix, limit=10):
+        """Postcodes starting with prefix, in sorted order."""
+        return []
+
+    def suggest(self, postcode, limit=10):
+        """Postcodes one typo away from postcode, in sorted order."""
+        return []
+
+    def memory_footprint(self):
+        """Approximate bytes of RAM the backend holds once open."""
+        return 0
+
+    def warm_up(self, postcodes=WARM_UP_POSTCODES):
+        """Touch the data so the user's first lookup does not pay for it."""
+        for postcode in postcodes:
+            self.lookup(postcode)
+
+    def close(self):
+        """Release the backend's data. Lookups already running may finish."""
+
+class PendingBackend(PostcodeBackend):
+    """Stands in until the background load thread has chosen a backend; finds nothing."""
+
+    name = "pending"
+
+    def ready(self):
+        return False
+
+    def lookup(self, postcode):
+        return None
+
+class IndexBackend(PostcodeBackend):
+    """The packaged postcode files through postcode_lookup, in one index format."""
+
+    def __init__(self, index_format, cache_dir=None):
+        self.name = index_format
+        self.loader = PostcodeLoader(index_format=index_format, cache_dir=cache_dir)
+
+    def open(self):
+        self.loader.start()
+
+    def ready(self):
+        return self.loader.state == PostcodeLoader.READY
+
+    def load_error(self):
+        # The loader's own thread records why the load failed
+        return self.error or self.loader.error
+
+    def lookup(self, postcode):
+        return self.loader.lookup(postcode)
+
+    def lookup_many(self, postcodes):
+        return self.loader.lookup_many(postcodes)
+
+    def complete(self, prefix, limit=10):
+        return self.loader.complete(prefix, limit)
+
+    def suggest(self, postcode, limit=10):
+        return self.loader.suggest(postcode, limit)
+
+    def memory_footprint(self):
+        return estimated_memory(self.name)
+
+    def close(self):
+        self.loader.close()
+
+class SQLiteBackend(PostcodeBackend):
+    """postcodes.db through PostcodeDB."""
+
+    name = "sqlite"
+
+    # SQLite's default page cache, per pooled connection
+    CACHE_BYTES = 2000 * 1024
+
+    def __init__(self):
+        self.db = None
+
+    @classmethod
+    def available(cls):
+        return os.path.exists(os.path.join(get_app_data_path(), "postcodes.db"))
+
+    def open(self):
+        if self.db is None:
+            db_path = ensure_database()
+            if db_path is None:
+                raise FileNotFoundError("postcodes.db is missing from app_data")
+            self.db = PostcodeDB(db_path, brma_names=brma_name_map())
+
+    def ready(self):
+        # False until open() succeeds; a failed open leaves no database
+        return self.db is not None
+
+    # Until then lookups find nothing, as an empty table would
+    def lookup(self, postcode):
+        if self.db is None:
             return None
+        return self.db.lookup(postcode)
+
+    def lookup_many(self, postcodes):
+        if self.db is None:
+            pcds = [normalise_postcode(p) for p in postcodes]
+            return {"postcode": pcds, "brma_code": [None] * len(pcds),
+                    "brma_name": [None] * len(pcds), "country": [None] * len(pcds)}
+        return self.db.lookup_many(postcodes)
+
+    # Completion walks postcodes.idx through its mmapped restart table
+    # (postcodes.db has no sorted order to walk) and checks typo
+    # candidates against the database; neither decodes the packaged files
+    def complete(self, prefix, limit=10):
+        if self.db is None or not compact_available():
+            return []
+        return complete_from(self.db, prefix, limit)
+
+    def suggest(self, postcode, limit=10):
+        if self.db is None:
+            return []
+        return suggest_from(self.db, postcode, limit)
+
+    def memory_footprint(self):
+        return self.db.pool_size * self.CACHE_BYTES if self.db else 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+def available_memory():
+    """Bytes of RAM available to new allocations, or None where it cannot be read."""
+    # Linux and Android
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
 
-        brma, brma_name = row
+def storage_read_latency(path, reads=32, size=4096):
+    """
+    Median seconds per random small read of path, as a rough measure of
+    how fast the storage answers the few-page reads an mmap lookup makes.
+
+    Where os.posix_fadvise exists (Linux, Android) the file's cached pages
+    are dropped first, so the reads go to the device. Elsewhere, or for
+    pages another process holds, they may come from the OS page cache and
+    any storage looks fast. Only small scattered reads are timed, not
+    the sequential throughput a full load of the compact files depends on.
+    """
+    file_size = os.path.getsize(path)
+    rng = random.Random(0)
+    timings = []
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        for _ in range(reads):
+            f.seek(rng.randrange(max(file_size - size, 1)))
+            start = time.perf_counter()
+            f.read(size)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+# storage_read_latency results, kept in app_data so the probe (which
+# drops the file's cached pages) runs once per install of the data
+STORAGE_PROBE_NAME = "storage_probe.json"
+
+def cached_read_latency(path, cache_dir):
+    """
+    storage_read_latency(path), remembered in cache_dir against the
+    file's path, size and mtime. Later launches reuse it until the
+    packaged data changes.
+    """
+    stat = os.stat(path)
+    key = [path, stat.st_size, stat.st_mtime_ns]
+    probe_path = os.path.join(cache_dir, STORAGE_PROBE_NAME)
 
-        # Match your existing return format
-        return {
-            "brma": brma,
-            "country": brma_name  # you can rename this later if needed
-        }
+    try:
+        with open(probe_path, encoding="utf-8") as f:
+            probe = json.load(f)
+        if probe["key"] == key:
+            return probe["latency"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    latency = storage_read_latency(path)
+    tmp_path = probe_path + ".tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "latency": latency}, f)
+        os.replace(tmp_path, probe_path)
+    except OSError as e:
+        # The next launch probes again
+        print("Could not save storage probe:", e)
+    return latency
+
+# Random 4 KB reads at or under this are flash/SSD class: an mmap format
+# that reads a few pages per lookup is then as fast as holding all
+# postcodes in RAM
+FAST_STORAGE_SECONDS = 0.0002
+
+def choose_postcode_backend(cache_dir=None):
+    """
+    Pick the postcode backend for this device at startup:
+
+    - fast storage: the best packaged mmap format, leaving RAM free
+    - slow storage and RAM to spare: the compact files decoded into memory
+    - slow storage and little RAM: the mmap format anyway
+    - no usable packaged files: postcodes.db
+
+    Timing the storage drops pages from the OS cache and waits on the
+    device, so this runs on the background load thread, and the timing is
+    kept in cache_dir (when given) for later launches.
+    """
+    mapped = available_index_format()
+    if mapped == "compact":
+        # No mmap format is packaged
+        mapped = None
+    compact = compact_available()
+    free = available_memory()
+
+    # Probe the biggest packaged data file the lookups will read, where
+    # random offsets land far apart; never the small shards/index.json
+    probe_names = ["postcodes_data.bin", "postcodes.idx"]
+    if mapped is not None and not INDEX_FORMATS[mapped].FILENAME.endswith(".json"):
+        probe_names.append(INDEX_FORMATS[mapped].FILENAME)
+    probe_paths = [path for path in map(find_packaged, probe_names) if path]
+
+    latency = None
+    if mapped is not None and probe_paths:
+        probe_path = max(probe_paths, key=os.path.getsize)
+        if cache_dir is None:
+            latency = storage_read_latency(probe_path)
+        else:
+            latency = cached_read_latency(probe_path, cache_dir)
+
+    if latency is not None and latency <= FAST_STORAGE_SECONDS:
+        backend = IndexBackend(mapped, cache_dir)
+    elif compact and (free is None or free >= 2 * estimated_memory("compact")):
+        backend = IndexBackend("compact", cache_dir)
+    elif mapped is not None:
+        backend = IndexBackend(mapped, cache_dir)
+    elif SQLiteBackend.available():
+        backend = SQLiteBackend()
+    else:
+        # Nothing to load from; the compact loader reports what is missing
+        backend = IndexBackend("compact", cache_dir)
+
+    print(
+        f"Postcode backend: {backend.name} "
+        f"(available RAM {'unknown' if free is None else f'{free / 2**20:.0f} MB'}, "
+        f"storage read {'not measured' if latency is None else f'{latency * 1e6:.0f} us'})"
+    )
+    return backend
 
 # Define the main application class
 class BenefitBuddy(App):
@@ -6296,6 +6827,9 @@ class BenefitBuddy(App):
         
         self.calculator_state = CalculatorState()
         self.engine = CalculatorEngine()
+        # Chosen and opened by DisclaimerScreen's background load thread
+        self.postcode_backend = PendingBackend()
+        self.postcode_cache = LRUCache(POSTCODE_CACHE_SIZE)
 
         # Save callbacks
         self.save_callbacks = {
@@ -6312,8 +6846,53 @@ class BenefitBuddy(App):
         self.nav.go("disclaimer")
         return self.sm
     
+    def use_postcode_backend(self, name):
+        """
+        Switch lookups to another backend at runtime: "sqlite"
+        (postcodes.db), "compact" or any postcode_lookup index format.
+        """
+        if name == "sqlite":
+            backend = SQLiteBackend()
+        elif name == "compact" or name in INDEX_FORMATS:
+            backend = IndexBackend(name, cache_dir=get_app_data_path())
+        else:
+            raise ValueError(f"Unknown postcode backend {name!r}")
+
+        backend.open()
+        old, self.postcode_backend = self.postcode_backend, backend
+        self.postcode_cache.clear()
+        # Frees the old backend's data; a lookup still running on another
+        # thread finishes against it
+        old.close()
+
     def lookup_postcode(self, postcode):
-        return compact_lookup(postcode)
+        # The Housing screen asks for the BRMA and the location of the
+        # same postcode back to back, and users re-enter postcodes while
+        # editing; misses (None) are cached too, but only once the backend
+        # is ready, so an answer given before then is not kept. A backend
+        # that failed to load, or a corrupt block, finds nothing rather
+        # than taking the screen down
+        backend = self.postcode_backend
+        try:
+            if not backend.ready():
+                return backend.lookup(postcode)
+            return self.postcode_cache.get_or_load(normalise_postcode(postcode), backend.lookup)
+        except (OSError, ValueError, RuntimeError) as e:
+            print("Postcode lookup error:", e)
+            return None
+
+    def postcode_cache_stats(self):
+        """One line on how the postcode result cache is doing, for diagnostics."""
+        cache = self.postcode_cache
+        return f"Postcode result cache: {cache.hits} hits, {cache.misses} misses, {len(cache)}/{cache.maxsize} entries"
+
+    def postcode_suggestions(self, text, limit=5):
+        """Postcodes completing what has been typed, or one typo away from it."""
+        backend = self.postcode_backend
+        matches = backend.complete(text, limit)
+        if not matches:
+            matches = backend.suggest(text, limit)
+        return matches
 
     # ============================
     # PRELOAD HELPERS FOR STARTUP
@@ -6442,9 +7021,15 @@ class BenefitBuddy(App):
         self.check_memory()
         
         print("\n[5] Postcode Lookup Test")
+        backend = self.postcode_backend
+        print(f"  Backend: {backend.name} (~{backend.memory_footprint() / 2**20:.1f} MB in RAM)")
+        if backend.failed():
+            print("  ✖ Failed to load:", backend.load_error())
         print("  SW1A1AA →", self.lookup_postcode("SW1A1AA"))
         print("  DN350HQ →", self.lookup_postcode("DN350HQ"))
         print("  ZE39XP →", self.lookup_postcode("ZE39XP"))
+
+        print(f"  {self.postcode_cache_stats()}")
     
         print("\n=== Startup Diagnostics Complete ===\n")
 
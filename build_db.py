@@ -1,8 +1,17 @@
-from db_builder import build_database
+import argparse
 import os
 
+from db_builder import SCHEMA_VERSIONS, build_database
+
 csv_path = os.path.join("data", "pcode_brma_lookup_clean.csv")
 db_path = os.path.join("app_data", "postcodes.db")
 
-build_database(csv_path, db_path)
+parser = argparse.ArgumentParser(description="Build app_data/postcodes.db from the cleaned ONS CSV.")
+parser.add_argument(
+    "--schema", choices=sorted(SCHEMA_VERSIONS), default="hash",
+    help="postcodes table layout: hash (CRC32 + text) or packed (WITHOUT ROWID on the packed key)"
+)
+args = parser.parse_args()
+
+build_database(csv_path, db_path, schema=args.schema)
 print("Database built:", db_path)
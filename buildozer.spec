@@ -3,8 +3,8 @@ title = Benefit Buddy
 package.name = benefitbuddy
 package.domain = org.benefitbuddy.app
 source.dir = .
-source.include_exts = py,png,jpg,kv,atlas,json,ttf,otf,csv,db,bin,idx
-source.include_patterns = app_data/*, app_data/postcodes/*, data/*.csv, font/*.ttf, images/*.png, images/*.jpg, images/*.gif
+source.include_exts = py,png,jpg,kv,atlas,json,ttf,otf,csv,db,bin,idx,zidx
+source.include_patterns = app_data/*, app_data/postcodes/*, app_data/postcodes/shards/*, data/*.csv, font/*.ttf, images/*.png, images/*.jpg, images/*.gif
 android.add_src = app_data
 version = 1.0.0
 requirements = python3,kivy,kivymd
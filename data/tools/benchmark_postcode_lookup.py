@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", ".."))
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmark_results.json")
+
+# Metric name -> which direction is better
+METRICS = {
+    "load_seconds": "lower",
+    "load_rss_mb": "lower",
+    "peak_rss_mb": "lower",
+    "reconstruct_seconds": "lower",
+    "hit_lookups_per_sec": "higher",
+    "miss_lookups_per_sec": "higher",
+    "malformed_lookups_per_sec": "higher",
+    "bulk_lookups_per_sec": "higher",
+}
+
+# Absolute changes below these are timer/allocator noise, whatever the ratio
+NOISE_FLOOR = {
+    "load_seconds": 0.01,
+    "load_rss_mb": 1.0,
+    "peak_rss_mb": 1.0,
+    "reconstruct_seconds": 0.01,
+}
+
+MALFORMED = [
+    "", "   ", "NOT A POSTCODE", "SW1A1AAA9", "12345", "££££",
+    "sw1a-1aa", "Ω1 1AA", "A", "ZZZZZZZZZZZZZZZZ",
+]
+
+INWARD_LETTERS = "ABDEFGHJLNPQRSTUWXYZ"
+
+def import_postcode_lookup():
+    """postcode_lookup resolves its files through kivy's resource paths."""
+    sys.path.insert(0, REPO_DIR)
+    from kivy.resources import resource_add_path
+    resource_add_path(REPO_DIR)
+    import postcode_lookup
+    return postcode_lookup
+
+def peak_rss_mb():
+    # VmHWM belongs to this process image; ru_maxrss on Linux also
+    # carries the parent's peak over fork/exec
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+# ============================================================
+# Sample inputs (built once in the parent process)
+# ============================================================
+
+def make_samples(size, seed):
+    from test_postcode_files import reconstruct_all_postcodes
+
+    postcode_lookup = import_postcode_lookup()
+    postcodes = reconstruct_all_postcodes(postcode_lookup.load_binary("postcodes.idx"))
+    known = set(postcodes)
+    rng = random.Random(seed)
+
+    hits = rng.sample(postcodes, min(size, len(postcodes)))
+
+    misses = []
+    while len(misses) < len(hits):
+        pcd = rng.choice(postcodes)
+        pcd = pcd[:-2] + rng.choice(INWARD_LETTERS) + rng.choice(INWARD_LETTERS)
+        if pcd not in known:
+            misses.append(pcd)
+
+    malformed = [MALFORMED[i % len(MALFORMED)] for i in range(len(hits))]
+
+    return {"entries": len(postcodes), "hits": hits, "misses": misses, "malformed": malformed}
+
+# ============================================================
+# One index format, measured in a fresh process
+# ============================================================
+
+def best_rate(fn, items, repeat):
+    """Best items/second over `repeat` runs, as timeit does."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(items)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best if best else 0.0
+
+def run_format(index_format, samples, repeat):
+    postcode_lookup = import_postcode_lookup()
+    lookup = postcode_lookup.lookup_postcode
+
+    def single(pcds):
+        for pcd in pcds:
+            lookup(pcd)
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    postcode_lookup.load_all_postcode_data(index_format=index_format)
+    result = {"load_seconds": time.perf_counter() - start}
+
+    rss_after = peak_rss_mb()
+    if rss_after is not None:
+        result["peak_rss_mb"] = rss_after
+        result["load_rss_mb"] = rss_after - rss_before
+
+    if index_format == "compact":
+        idx_bytes = postcode_lookup.load_binary("postcodes.idx")
+        start = time.perf_counter()
+        postcode_lookup.reconstruct_all_postcodes(idx_bytes)
+        result["reconstruct_seconds"] = time.perf_counter() - start
+
+    result["hit_lookups_per_sec"] = best_rate(single, samples["hits"], repeat)
+    result["miss_lookups_per_sec"] = best_rate(single, samples["misses"], repeat)
+    result["malformed_lookups_per_sec"] = best_rate(single, samples["malformed"], repeat)
+    result["bulk_lookups_per_sec"] = best_rate(
+        postcode_lookup.lookup_postcodes, samples["hits"] + samples["misses"], repeat
+    )
+    return result
+
+def run_format_isolated(index_format, sample_path, repeat):
+    """Run one format in a child process so load time and RSS start cold."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_path = os.path.join(tmp_dir, "result.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", index_format,
+             "--samples", sample_path, "--child-out", out_path, "--repeat", str(repeat)],
+            check=True
+        )
+        with open(out_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+# ============================================================
+# Baseline comparison
+# ============================================================
+
+def compare(results, baseline, threshold):
+    """Print each metric against the baseline; returns the regressions."""
+    regressions = []
+
+    if baseline["meta"].get("entries") != results["meta"].get("entries"):
+        print("WARNING: baseline was recorded on a different dataset "
+              f"({baseline['meta'].get('entries')} vs {results['meta'].get('entries')} postcodes)")
+
+    print(f"\n--- Compared with baseline (threshold {threshold:.0%}) ---")
+    for index_format, metrics in results["formats"].items():
+        base_metrics = baseline["formats"].get(index_format)
+        if base_metrics is None:
+            print(f"{index_format}: not in baseline")
+            continue
+
+        for name, value in metrics.items():
+            base = base_metrics.get(name)
+            if base is None or name not in METRICS:
+                continue
+
+            change = (value - base) / base if base else 0.0
+            if METRICS[name] == "lower":
+                regressed = value > base * (1 + threshold)
+            else:
+                regressed = value < base * (1 - threshold)
+            regressed = regressed and abs(value - base) > NOISE_FLOOR.get(name, 0)
+
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{index_format:<8} {name:<26} {base:14.3f} -> {value:14.3f} ({change:+.1%}){flag}")
+            if regressed:
+                regressions.append((index_format, name))
+
+    return regressions
+
+def print_results(results):
+    print("\n--- Benchmark results ---")
+    print(f"Dataset: {results['meta']['entries']} postcodes, sample {results['meta']['sample_size']}")
+    for index_format, metrics in results["formats"].items():
+        print(f"\n{index_format}")
+        for name, value in metrics.items():
+            print(f"  {name:<26} {value:14.3f}")
+
+def main(args):
+    postcode_lookup = import_postcode_lookup()
+    formats = args.formats.split(",") if args.formats else (
+        [name for name, cls in postcode_lookup.INDEX_FORMATS.items() if cls.available()] + ["compact"]
+    )
+
+    print("Building samples...")
+    samples = make_samples(args.sample_size, args.seed)
+
+    results = {
+        "meta": {
+            "entries": samples["entries"],
+            "sample_size": len(samples["hits"]),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": postcode_lookup.numpy is not None,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "formats": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = os.path.join(tmp_dir, "samples.json")
+        with open(sample_path, "w", encoding="utf-8") as f:
+            json.dump(samples, f)
+
+        for index_format in formats:
+            print(f"Benchmarking {index_format}...")
+            results["formats"][index_format] = run_format_isolated(index_format, sample_path, args.repeat)
+
+    print_results(results)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print("\nResults written:", args.out)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Baseline written:", args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed beyond {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark postcode loading and lookups for each packaged index format."
+    )
+    parser.add_argument("--formats", help="comma-separated formats (default: every packaged format + compact)")
+    parser.add_argument("--sample-size", type=int, default=100000, help="postcodes per lookup benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per lookup benchmark; the best is kept")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=RESULTS_PATH, help="where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument(
+        "--save-baseline",
+        help="also write these results as a new baseline (timings are per machine; "
+             "benchmark_baseline.json next to this script is ignored by git)"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.20,
+        help="allowed relative change before a metric counts as regressed (default: 0.20)"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--samples", help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.samples, "r", encoding="utf-8") as f:
+            samples = json.load(f)
+        with open(args.child_out, "w", encoding="utf-8") as f:
+            json.dump(run_format(args.child, samples, args.repeat), f)
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import tempfile
+
+import build_postcode_files
+from build_postcode_files import BASE_DIR, merge_runs, spill_sorted_runs
+# build_postcode_files has put the repo root on sys.path
+from postcode_formats import (
+    COMPACT_HEADER, DELTA_VERSION, FINGERPRINTED_HEADERS, dataset_fingerprint, shard_fingerprint,
+)
+
+def load_base(base_dir):
+    with open(os.path.join(base_dir, "postcodes.idx"), "rb") as f:
+        idx_bytes = f.read()
+    with open(os.path.join(base_dir, "postcodes_data.bin"), "rb") as f:
+        data_bytes = f.read()
+    with open(os.path.join(base_dir, "brma_dict.json"), "r", encoding="utf-8") as f:
+        brma_dict = json.load(f)
+    with open(os.path.join(base_dir, "country_dict.json"), "r", encoding="utf-8") as f:
+        country_dict = json.load(f)
+    with open(os.path.join(base_dir, "brma_names.json"), "r", encoding="utf-8") as f:
+        brma_names = json.load(f)
+
+    brma_rev = {v: k for k, v in brma_dict.items()}
+    country_rev = {v: k for k, v in country_dict.items()}
+
+    return idx_bytes, data_bytes, brma_rev, country_rev, brma_names
+
+def base_fingerprints(base_dir):
+    """
+    {file: dataset_fingerprint} for every index file in base_dir, so the
+    app can check the delta against whichever format it reads.
+    """
+    fingerprints = {}
+    for name, (layout, _, _) in FINGERPRINTED_HEADERS.items():
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                fingerprints[name] = dataset_fingerprint(name, f.read(layout.size))
+
+    shard_index = os.path.join(base_dir, "shards", "index.json")
+    if os.path.exists(shard_index):
+        with open(shard_index, "r", encoding="utf-8") as f:
+            fingerprints["shards/index.json"] = shard_fingerprint(json.load(f))
+
+    return {name: fingerprint for name, fingerprint in fingerprints.items() if fingerprint is not None}
+
+def iter_base(idx_bytes, data_bytes, brma_rev, country_rev):
+    """Decode the shipped files back into sorted (postcode, brma, country)."""
+    count = COMPACT_HEADER.unpack_from(idx_bytes, 0)[3]
+    pos = COMPACT_HEADER.size
+    prev = ""
+    for i in range(count):
+        prefix_len = idx_bytes[pos]
+        suffix_len = idx_bytes[pos + 1]
+        pos += 2
+
+        prev = prev[:prefix_len] + idx_bytes[pos:pos + suffix_len].decode("ascii")
+        pos += suffix_len
+
+        yield prev, brma_rev[data_bytes[i * 2]], country_rev[data_bytes[i * 2 + 1]]
+
+def first_per_postcode(records):
+    """Drop repeated postcodes: lookups only ever see the first one."""
+    prev = None
+    for record in records:
+        if record[0] != prev:
+            yield record
+            prev = record[0]
+
+def diff_sorted(base, new):
+    """
+    Merge-join two sorted record streams. Returns (upserts, removed):
+    postcodes added or changed in `new`, and postcodes missing from it.
+    """
+    upserts = {}
+    removed = []
+
+    base = first_per_postcode(base)
+    new = first_per_postcode(new)
+    b = next(base, None)
+    n = next(new, None)
+
+    while b is not None or n is not None:
+        if n is None or (b is not None and b[0] < n[0]):
+            removed.append(b[0])
+            b = next(base, None)
+        elif b is None or n[0] < b[0]:
+            upserts[n[0]] = [n[1], n[2]]
+            n = next(new, None)
+        else:
+            if b[1:] != n[1:]:
+                upserts[n[0]] = [n[1], n[2]]
+            b = next(base, None)
+            n = next(new, None)
+
+    return upserts, removed
+
+def build_delta(base_dir, out_path, chunk_size):
+    print("Loading current compact files from", base_dir)
+    idx_bytes, data_bytes, brma_rev, country_rev, brma_names = load_base(base_dir)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("Sorting new CSV:", build_postcode_files.CSV_PATH)
+        run_paths, new_names = spill_sorted_runs(tmp_dir, chunk_size)
+
+        print("Comparing...")
+        upserts, removed = diff_sorted(
+            iter_base(idx_bytes, data_bytes, brma_rev, country_rev),
+            merge_runs(run_paths)
+        )
+
+    # Only names the app cannot already resolve from its own tables
+    touched = {brma for brma, _ in upserts.values()}
+    delta_names = {
+        brma: new_names[brma] for brma in sorted(touched)
+        if brma in new_names and brma_names.get(brma) != new_names[brma]
+    }
+
+    delta = {
+        "version": DELTA_VERSION,
+        "base": base_fingerprints(base_dir),
+        "brma_names": delta_names,
+        "upserts": upserts,
+        "removed": removed,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f, indent=1)
+
+    print(f"Added/changed: {len(upserts)}  Removed: {len(removed)}")
+    print("Delta written:", out_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Diff a new cleaned CSV against the current compact postcode files."
+    )
+    parser.add_argument("--csv", default=build_postcode_files.CSV_PATH, help="new cleaned CSV")
+    parser.add_argument("--base-dir", default=BASE_DIR, help="directory holding the current compact files")
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "postcodes_delta.json"))
+    parser.add_argument("--chunk-size", type=int, default=500000, help="rows per sorted run")
+    args = parser.parse_args()
+
+    build_postcode_files.CSV_PATH = args.csv
+    build_delta(args.base_dir, args.out, args.chunk_size)
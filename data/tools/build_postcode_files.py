@@ -1,20 +1,105 @@
+import argparse
 import csv
 import os
+import sys
 import json
+import heapq
+import struct
+import random
+import shutil
+import tempfile
+import time
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", ".."))
+
+# Postcode keys and file layouts are shared with the app (postcode_keys.py
+# and postcode_formats.py at the repo root)
+sys.path.insert(0, REPO_DIR)
+from postcode_keys import KEY_WIDTH, pack_postcode
+from postcode_formats import (
+    COMPACT_HEADER, COMPACT_MAGIC, COMPACT_RESTART, COMPACT_VERSION,
+    FIXED_BLOCK, FIXED_HEADER, FIXED_MAGIC, FIXED_VERSION,
+    PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION,
+    PHF_HEADER, PHF_MAGIC, PHF_VERSION, phf_hash, phf_slot,
+    SHARD_RECORD_SIZE, SHARD_VERSION, postcode_area,
+    STRING_TABLE_HEADER, STRING_TABLE_MAGIC, STRING_TABLE_VERSION,
+    ZIDX_BLOCK, ZIDX_HEADER, ZIDX_MAGIC, ZIDX_VERSION,
+)
+
 CSV_PATH = os.path.join(BASE_DIR, "..", "..", "data", "pcode_brma_lookup_clean.csv")
 CSV_PATH = os.path.normpath(CSV_PATH)
+# Where the built files are written; copy them to app_data/postcodes to ship
+OUT_DIR = BASE_DIR
 
 def normalise_postcode(p):
     return p.replace(" ", "").upper().strip()
 
-def load_and_sort_postcodes():
-    postcodes = []
-    brma_list = []
-    country_list = []
-    brma_name_map = {}
+# ============================================================
+# Buffered output and phase timing
+# ============================================================
+
+BLOCK_SIZE = 1 << 20
+
+class BlockWriter:
+    """
+    Collects encoded records in a bytearray and hands them to the file in
+    BLOCK_SIZE blocks, instead of several small f.write calls per record.
+    """
+
+    def __init__(self, f, block_size=BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.buf = bytearray()
+
+    def write(self, data):
+        self.buf += data
+        if len(self.buf) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.buf:
+            self.f.write(self.buf)
+            self.buf.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+class PhaseTimer:
+    """Wall-clock time per build phase, printed as a report at the end."""
+
+    def __init__(self):
+        self.phases = []
+
+    def phase(self, name):
+        timer = self
 
+        class _Phase:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.phases.append((name, time.perf_counter() - self.start))
+
+        return _Phase()
+
+    def report(self):
+        print("\n--- Build timings ---")
+        width = max((len(name) for name, _ in self.phases), default=0)
+        for name, seconds in self.phases:
+            print(f"{name:<{width}}  {seconds:8.2f}s")
+        print(f"{'total':<{width}}  {sum(s for _, s in self.phases):8.2f}s")
+
+def read_rows():
+    """Yield (postcode, brma, country, brma_name) for every CSV row, normalised."""
     with open(CSV_PATH, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
 
@@ -27,13 +112,22 @@ def load_and_sort_postcodes():
             # If not, the BRMA code will be used as the name (safe fallback)
             brma_name = row.get("brma_name", brma).strip()
 
-            postcodes.append(pcd)
-            brma_list.append(brma)
-            country_list.append(country)
+            yield pcd, brma, country, brma_name
+
+def load_and_sort_postcodes():
+    postcodes = []
+    brma_list = []
+    country_list = []
+    brma_name_map = {}
+
+    for pcd, brma, country, brma_name in read_rows():
+        postcodes.append(pcd)
+        brma_list.append(brma)
+        country_list.append(country)
 
-            # Build BRMA code → BRMA name mapping
-            if brma not in brma_name_map:
-                brma_name_map[brma] = brma_name
+        # Build BRMA code → BRMA name mapping
+        if brma not in brma_name_map:
+            brma_name_map[brma] = brma_name
 
     # Sort by postcode (keeping BRMA/country aligned)
     combined = list(zip(postcodes, brma_list, country_list))
@@ -43,58 +137,178 @@ def load_and_sort_postcodes():
 
     return list(postcodes), list(brma_list), list(country_list), brma_name_map
 
-def build_compact_files(postcodes, brma_list, country_list, brma_name_map):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+# ============================================================
+# Streaming build: external merge sort
+# ============================================================
+
+def spill_sorted_runs(tmp_dir, chunk_size):
+    """
+    Read the CSV chunk_size rows at a time, sort each chunk by postcode and
+    write it to tmp_dir as a run file. Returns (run paths, BRMA names).
+    """
+    run_paths = []
+    brma_name_map = {}
+    chunk = []
+
+    def spill():
+        chunk.sort(key=lambda x: x[0])
+        path = os.path.join(tmp_dir, f"run_{len(run_paths):05d}.tsv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.writelines(f"{p}\t{brma}\t{country}\n" for p, brma, country in chunk)
+        run_paths.append(path)
+        chunk.clear()
+
+    for pcd, brma, country, brma_name in read_rows():
+        chunk.append((pcd, brma, country))
+        if brma not in brma_name_map:
+            brma_name_map[brma] = brma_name
+        if len(chunk) >= chunk_size:
+            spill()
+
+    if chunk:
+        spill()
+
+    return run_paths, brma_name_map
+
+def iter_run(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        for line in f:
+            yield tuple(line.rstrip("\n").split("\t"))
+
+def merge_runs(run_paths):
+    """
+    k-way merge of the sorted runs into one sorted stream of
+    (postcode, brma, country). Ties keep run order, i.e. CSV order, the
+    same as the stable in-memory sort.
+    """
+    return heapq.merge(*(iter_run(p) for p in run_paths), key=lambda r: r[0])
+
+def common_prefix_len(prev, p):
+    prefix_len = 0
+    max_len = min(len(prev), len(p))
+    while prefix_len < max_len and prev[prefix_len] == p[prefix_len]:
+        prefix_len += 1
+    return prefix_len
+
+# Entries per postcodes.idx block (layout in postcode_formats.py)
+COMPACT_RESTART_INTERVAL = 32
+
+def finish_compact_index(idx_f, data_f, table, count, table_offset):
+    """
+    Read the written entries and records back block by block to fill in
+    each block's CRC32, then append the restart table and write the
+    header. Both files must be open for reading and writing.
+    """
+    idx_f.flush()
+    data_f.flush()
+    idx_f.seek(COMPACT_HEADER.size)
+    data_f.seek(0)
+
+    file_crc = 0
+    blocks = len(table) // COMPACT_RESTART.size
+    for block in range(blocks):
+        offset, entry, _, _ = COMPACT_RESTART.unpack_from(table, block * COMPACT_RESTART.size)
+        if block + 1 < blocks:
+            end_offset, end_entry, _, _ = COMPACT_RESTART.unpack_from(table, (block + 1) * COMPACT_RESTART.size)
+        else:
+            end_offset, end_entry = table_offset, count
+
+        entries = idx_f.read(end_offset - offset)
+        records = data_f.read((end_entry - entry) * 2)
+        struct.pack_into("<I", table, block * COMPACT_RESTART.size + 8, zlib.crc32(records, zlib.crc32(entries)))
+        file_crc = zlib.crc32(entries, file_crc)
+
+    idx_f.seek(table_offset)
+    idx_f.write(table)
+    idx_f.seek(0)
+    idx_f.write(COMPACT_HEADER.pack(
+        COMPACT_MAGIC, COMPACT_VERSION, COMPACT_RESTART_INTERVAL, count, table_offset,
+        zlib.crc32(table, file_crc), zlib.crc32(table)
+    ))
+
+def write_compact_files(records, brma_name_map):
+    """
+    Write postcodes.idx, postcodes_data.bin and the dictionaries in a
+    single pass over sorted (postcode, brma, country) records, numbering
+    BRMAs and countries in order of first appearance. `records` can be a
+    stream. Returns (brma_dict, country_dict).
+    """
+    base_dir = OUT_DIR
     idx_path = os.path.join(base_dir, "postcodes.idx")
     data_path = os.path.join(base_dir, "postcodes_data.bin")
-    brma_dict_path = os.path.join(base_dir, "brma_dict.json")
-    country_dict_path = os.path.join(base_dir, "country_dict.json")
-    brma_names_path = os.path.join(base_dir, "brma_names.json")
 
     print("\nWriting compact postcode index:", idx_path)
+    print("Writing BRMA/country data:", data_path)
 
-    with open(idx_path, "wb") as f:
-        prev = ""
-        for p in postcodes:
-            prefix_len = 0
-            max_len = min(len(prev), len(p))
-            while prefix_len < max_len and prev[prefix_len] == p[prefix_len]:
-                prefix_len += 1
-
-            suffix = p[prefix_len:]
-
-            f.write(bytes([prefix_len]))
-            f.write(bytes([len(suffix)]))
-            f.write(suffix.encode("ascii"))
-
-            prev = p
+    brma_dict = {}
+    country_dict = {}
+    count = 0
+    table = bytearray()
 
-    print("postcodes.idx written.")
+    with open(idx_path, "w+b") as idx_f, open(data_path, "w+b") as data_f:
+        # Header is filled in once the count and table offset are known
+        idx_f.write(bytes(COMPACT_HEADER.size))
+        offset = COMPACT_HEADER.size
+        block_start = -COMPACT_RESTART_INTERVAL
 
-    print("\nWriting BRMA/country data:", data_path)
+        # Encode into bytearrays and write them out a block at a time
+        idx_buf = bytearray()
+        data_buf = bytearray()
 
-    brma_dict = {}
-    country_dict = {}
+        prev = ""
+        for p, brma, country in records:
+            # The restart table stores keys in KEY_WIDTH bytes; struct
+            # would silently cut a longer one
+            if len(p) > KEY_WIDTH:
+                raise ValueError(f"Postcode longer than {KEY_WIDTH} characters: {p}")
+            # Restart points never split a run of equal postcodes, so a
+            # lookup always lands on the first of them
+            if count - block_start >= COMPACT_RESTART_INTERVAL and p != prev:
+                table += COMPACT_RESTART.pack(offset, count, 0, p.encode("ascii"))
+                block_start = count
+                prefix_len = 0
+            else:
+                prefix_len = common_prefix_len(prev, p)
+            suffix = p[prefix_len:].encode("ascii")
+            offset += 2 + len(suffix)
+
+            idx_buf.append(prefix_len)
+            idx_buf.append(len(suffix))
+            idx_buf += suffix
+
+            if brma not in brma_dict:
+                brma_dict[brma] = len(brma_dict)
+
+            if country not in country_dict:
+                country_dict[country] = len(country_dict)
+
+            data_buf.append(brma_dict[brma])
+            data_buf.append(country_dict[country])
+
+            if len(idx_buf) >= BLOCK_SIZE:
+                idx_f.write(idx_buf)
+                idx_buf.clear()
+                data_f.write(data_buf)
+                data_buf.clear()
 
-    brma_id_list = []
-    country_id_list = []
+            prev = p
+            count += 1
 
-    for brma, country in zip(brma_list, country_list):
-        if brma not in brma_dict:
-            brma_dict[brma] = len(brma_dict)
+        idx_f.write(idx_buf)
+        data_f.write(data_buf)
+        finish_compact_index(idx_f, data_f, table, count, offset)
 
-        if country not in country_dict:
-            country_dict[country] = len(country_dict)
+    print(f"postcodes.idx and postcodes_data.bin written ({count} postcodes).")
 
-        brma_id_list.append(brma_dict[brma])
-        country_id_list.append(country_dict[country])
+    write_dictionaries(brma_dict, country_dict, brma_name_map)
 
-    with open(data_path, "wb") as f:
-        for b_id, c_id in zip(brma_id_list, country_id_list):
-            f.write(bytes([b_id]))
-            f.write(bytes([c_id]))
+    return brma_dict, country_dict
 
-    print("postcodes_data.bin written.")
+def write_dictionaries(brma_dict, country_dict, brma_name_map):
+    base_dir = OUT_DIR
+    brma_dict_path = os.path.join(base_dir, "brma_dict.json")
+    country_dict_path = os.path.join(base_dir, "country_dict.json")
+    brma_names_path = os.path.join(base_dir, "brma_names.json")
 
     # Write BRMA and country dictionaries
     with open(brma_dict_path, "w", encoding="utf-8") as f:
@@ -108,15 +322,627 @@ def build_compact_files(postcodes, brma_list, country_list, brma_name_map):
         json.dump(brma_name_map, f, indent=2)
 
     print("Dictionaries written.")
+
+    build_string_table(brma_dict, country_dict, brma_name_map)
+
     print("\n--- Compact file build complete ---\n")
 
-if __name__ == "__main__":
-    print("Loading and sorting postcodes...")
-    postcodes, brma_list, country_list, brma_name_map = load_and_sort_postcodes()
+# ============================================================
+# Parallel build: one partition per postcode area
+# ============================================================
+
+def encode_partition(records):
+    """
+    Worker: prefix/suffix-encode one area's sorted records, first entry in
+    full so the partition decodes on its own, and number its BRMAs and
+    countries locally in order of first appearance. Restart points are
+    returned relative to the partition as (byte offset, entry, postcode).
+    """
+    idx = bytearray()
+    brma_ids = bytearray()
+    country_ids = bytearray()
+    brmas = {}
+    countries = {}
+    restarts = []
+    block_start = -COMPACT_RESTART_INTERVAL
+
+    prev = ""
+    for i, (p, brma, country) in enumerate(records):
+        if len(p) > KEY_WIDTH:
+            raise ValueError(f"Postcode longer than {KEY_WIDTH} characters: {p}")
+        if i - block_start >= COMPACT_RESTART_INTERVAL and p != prev:
+            restarts.append((len(idx), i, p))
+            block_start = i
+            prefix_len = 0
+        else:
+            prefix_len = common_prefix_len(prev, p)
+        suffix = p[prefix_len:].encode("ascii")
+
+        idx.append(prefix_len)
+        idx.append(len(suffix))
+        idx += suffix
+
+        brma_ids.append(brmas.setdefault(brma, len(brmas)))
+        country_ids.append(countries.setdefault(country, len(countries)))
+
+        prev = p
+
+    return bytes(idx), bytes(brma_ids), bytes(country_ids), list(brmas), list(countries), restarts
+
+def global_id_table(local_codes, id_map):
+    """bytes.translate table from partition-local ids to global ids."""
+    for code in local_codes:
+        if code not in id_map:
+            id_map[code] = len(id_map)
+    ids = [id_map[code] for code in local_codes]
+    return bytes(ids + [0] * (256 - len(ids)))
+
+def write_compact_files_parallel(records, brma_name_map, workers):
+    """
+    Same output contract as write_compact_files, with the encoding spread
+    over `workers` processes. Records are cut into postcode-area
+    partitions; each is encoded independently and the results are
+    appended in order, so every partition starts with a full key (a
+    restart point) and the file still decodes as ordinary postcodes.idx;
+    the partitions' restart points are shifted into one table.
+    Partition-local ids are remapped in order, which gives the same
+    global numbering as a serial build.
+    """
+    base_dir = OUT_DIR
+    idx_path = os.path.join(base_dir, "postcodes.idx")
+    data_path = os.path.join(base_dir, "postcodes_data.bin")
+
+    print(f"\nWriting compact postcode index with {workers} workers:", idx_path)
+    print("Writing BRMA/country data:", data_path)
+
+    brma_dict = {}
+    country_dict = {}
+    count = 0
+    offset = COMPACT_HEADER.size
+    table = bytearray()
+
+    with ProcessPoolExecutor(workers) as pool, \
+         open(idx_path, "w+b") as idx_f, open(data_path, "w+b") as data_f:
+
+        idx_f.write(bytes(COMPACT_HEADER.size))
+
+        def drain(future):
+            nonlocal count, offset
+            idx, brma_ids, country_ids, brmas, countries, restarts = future.result()
+
+            data = bytearray(len(brma_ids) * 2)
+            data[0::2] = brma_ids.translate(global_id_table(brmas, brma_dict))
+            data[1::2] = country_ids.translate(global_id_table(countries, country_dict))
+
+            for pos, entry, p in restarts:
+                table.extend(COMPACT_RESTART.pack(offset + pos, count + entry, 0, p.encode("ascii")))
+
+            idx_f.write(idx)
+            data_f.write(data)
+            count += len(brma_ids)
+            offset += len(idx)
+
+        # Keep a bounded number of partitions in flight so a streamed
+        # input is never read far ahead of the writer
+        pending = deque()
+        for _, group in groupby(records, key=lambda r: postcode_area(r[0])):
+            pending.append(pool.submit(encode_partition, list(group)))
+            if len(pending) >= workers * 2:
+                drain(pending.popleft())
+
+        while pending:
+            drain(pending.popleft())
+
+        finish_compact_index(idx_f, data_f, table, count, offset)
+
+    print(f"postcodes.idx and postcodes_data.bin written ({count} postcodes).")
+
+    write_dictionaries(brma_dict, country_dict, brma_name_map)
+
+    return brma_dict, country_dict
+
+def build_compact_files(postcodes, brma_list, country_list, brma_name_map, workers=1):
+    """In-memory build: returns the per-postcode BRMA and country id lists."""
+    records = zip(postcodes, brma_list, country_list)
+    if workers > 1:
+        brma_dict, country_dict = write_compact_files_parallel(records, brma_name_map, workers)
+    else:
+        brma_dict, country_dict = write_compact_files(records, brma_name_map)
+
+    brma_id_list = [brma_dict[brma] for brma in brma_list]
+    country_id_list = [country_dict[country] for country in country_list]
+    return brma_id_list, country_id_list
+
+def build_string_table(brma_dict, country_dict, brma_name_map):
+    """
+    Write brma_table.bin so the app can map the ids in postcodes_data.bin
+    straight to BRMA code, BRMA name and country by list index, without
+    parsing the JSON dictionaries.
+    """
+    base_dir = OUT_DIR
+    table_path = os.path.join(base_dir, "brma_table.bin")
+
+    def encoded(text, length_size):
+        data = text.encode("utf-8")
+        return len(data).to_bytes(length_size, "little") + data
+
+    table = bytearray(STRING_TABLE_HEADER.pack(
+        STRING_TABLE_MAGIC, STRING_TABLE_VERSION, len(brma_dict), len(country_dict)
+    ))
+    for brma in sorted(brma_dict, key=brma_dict.get):
+        table += encoded(brma, 1)
+        table += encoded(brma_name_map.get(brma, brma), 2)
+    for country in sorted(country_dict, key=country_dict.get):
+        table += encoded(country, 1)
+
+    with open(table_path, "wb") as f:
+        f.write(table)
+
+    print("brma_table.bin written.")
+
+# Records per postcodes_fixed.idx and postcodes_keys.bin checksum block
+# (layouts in postcode_formats.py)
+FIXED_BLOCK_RECORDS = 256
+PACKED_BLOCK_RECORDS = 256
+
+def build_fixed_width_index(records):
+    """
+    Write postcodes_fixed.idx from sorted (postcode, BRMA id, country id)
+    records: every postcode as a 7-byte record, NUL-padded, in the same
+    order as postcodes_data.bin, followed by a table of blocks each with
+    a CRC32 over its keys and its postcodes_data.bin records. The app
+    mmaps this file and binary searches it in place. `records` can be a
+    stream.
+    """
+    base_dir = OUT_DIR
+    fixed_path = os.path.join(base_dir, "postcodes_fixed.idx")
+
+    print("\nWriting fixed-width postcode index:", fixed_path)
+
+    table = bytearray()
+    count = 0
+
+    with open(fixed_path, "wb") as f:
+        f.write(bytes(FIXED_HEADER.size))
+
+        with BlockWriter(f) as out:
+            keys = bytearray()
+            data = bytearray()
+            first = 0
+
+            def flush_block():
+                table.extend(FIXED_BLOCK.pack(first, zlib.crc32(data, zlib.crc32(keys)), keys[:KEY_WIDTH]))
+                out.write(keys)
+                keys.clear()
+                data.clear()
+
+            prev = ""
+            for p, b_id, c_id in records:
+                if len(p) > KEY_WIDTH:
+                    raise ValueError(f"Postcode longer than {KEY_WIDTH} characters: {p}")
+                if len(data) >= FIXED_BLOCK_RECORDS * 2 and p != prev:
+                    flush_block()
+                    first = count
+
+                keys += p.encode("ascii").ljust(KEY_WIDTH, b"\0")
+                data.append(b_id)
+                data.append(c_id)
+
+                prev = p
+                count += 1
+
+            if data:
+                flush_block()
+
+        table_offset = FIXED_HEADER.size + count * KEY_WIDTH
+        f.write(table)
+        f.seek(0)
+        f.write(FIXED_HEADER.pack(FIXED_MAGIC, FIXED_VERSION, FIXED_BLOCK_RECORDS, count, table_offset, zlib.crc32(table)))
+
+    print("postcodes_fixed.idx written.")
+
+def build_postcode_shards(postcodes, brma_id_list, country_id_list):
+    """
+    Write one shard per postcode area to shards/ plus a small
+    index.json directory. Each shard holds that area's sorted postcodes as
+    9-byte records (7-byte key, BRMA id, country id), so the app only
+    reads the areas it is actually asked about.
+    """
+    base_dir = OUT_DIR
+    shard_dir = os.path.join(base_dir, "shards")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    print("\nWriting postcode area shards:", shard_dir)
+
+    shards = {}
+    for p, b_id, c_id in zip(postcodes, brma_id_list, country_id_list):
+        area = postcode_area(p)
+        if not area:
+            raise ValueError(f"Postcode has no area letters: {p}")
+        record = p.encode("ascii").ljust(KEY_WIDTH, b"\0") + bytes([b_id, c_id])
+        shards.setdefault(area, bytearray()).extend(record)
+
+    for area, records in shards.items():
+        with open(os.path.join(shard_dir, f"{area}.bin"), "wb") as f:
+            f.write(records)
+
+    directory = {
+        "version": SHARD_VERSION,
+        "record_size": SHARD_RECORD_SIZE,
+        "shards": {area: len(records) // SHARD_RECORD_SIZE for area, records in shards.items()},
+        "checksums": {area: zlib.crc32(records) for area, records in shards.items()},
+    }
+    with open(os.path.join(shard_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(directory, f, indent=2)
+
+    print(f"{len(shards)} shards written.")
+
+def build_packed_keys(records):
+    """
+    Write postcodes_keys.bin from sorted (postcode, BRMA id, country id)
+    records: the postcodes as little-endian uint64 integers (readable
+    with array('Q') or numpy.frombuffer(dtype="<u8") after the header),
+    in the same order as postcodes_data.bin, with a CRC32 of the keys
+    and one per block of postcodes_data.bin records. `records` can be a
+    stream.
+    """
+    base_dir = OUT_DIR
+    keys_path = os.path.join(base_dir, "postcodes_keys.bin")
+
+    print("\nWriting packed integer keys:", keys_path)
+
+    table = array("I")
+    keys_crc = 0
+    count = 0
+
+    with open(keys_path, "wb") as f:
+        f.write(bytes(PACKED_HEADER.size))
+
+        keys = array("Q")
+        data = bytearray()
+        for p, b_id, c_id in records:
+            key = pack_postcode(p)
+            if key is None:
+                raise ValueError(f"Postcode cannot be packed (over {KEY_WIDTH} characters or not 0-9/A-Z): {p}")
+            keys.append(key)
+            data.append(b_id)
+            data.append(c_id)
+            count += 1
+
+            if len(data) == PACKED_BLOCK_RECORDS * 2:
+                table.append(zlib.crc32(data))
+                data.clear()
+            if len(keys) >= 65536:
+                chunk = to_le_bytes(keys)
+                keys_crc = zlib.crc32(chunk, keys_crc)
+                f.write(chunk)
+                keys = array("Q")
+
+        chunk = to_le_bytes(keys)
+        keys_crc = zlib.crc32(chunk, keys_crc)
+        f.write(chunk)
+
+        if data:
+            table.append(zlib.crc32(data))
+        table = to_le_bytes(table)
+        f.write(table)
+        f.seek(0)
+        f.write(PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, PACKED_BLOCK_RECORDS, count, keys_crc, zlib.crc32(table)))
+
+    print("postcodes_keys.bin written.")
+
+# Records per postcodes.zidx block (layout in postcode_formats.py)
+ZIDX_BLOCK_RECORDS = 256
+
+def build_compressed_index(records):
+    """
+    Write postcodes.zidx from sorted (postcode, BRMA id, country id)
+    records: about ZIDX_BLOCK_RECORDS postcodes per independently
+    compressed block, so the app only inflates the block a lookup lands
+    in. Keys are stored fixed-width rather than front-coded: zlib removes
+    the shared prefixes just as well, and the inflated block can be
+    bisected without decoding it. Like the restart points in
+    postcodes.idx, a block never splits a run of equal postcodes.
+    `records` can be a stream.
+    """
+    base_dir = OUT_DIR
+    zidx_path = os.path.join(base_dir, "postcodes.zidx")
+
+    print("\nWriting compressed postcode index:", zidx_path)
+
+    table = bytearray()
+    count = 0
+    raw_size = 0
+    blocks_crc = 0
+
+    with open(zidx_path, "wb") as f:
+        f.write(bytes(ZIDX_HEADER.size))
+        offset = ZIDX_HEADER.size
+
+        keys = bytearray()
+        data = bytearray()
+
+        def flush_block():
+            nonlocal offset, raw_size, blocks_crc
+            block = zlib.compress(bytes(keys + data), 9)
+            blocks_crc = zlib.crc32(block, blocks_crc)
+            f.write(block)
+            offset += len(block)
+            raw_size += len(keys) + len(data)
+            keys.clear()
+            data.clear()
+
+        prev = ""
+        for p, b_id, c_id in records:
+            if len(p) > KEY_WIDTH:
+                raise ValueError(f"Postcode longer than {KEY_WIDTH} characters: {p}")
+            if len(data) >= ZIDX_BLOCK_RECORDS * 2 and p != prev:
+                flush_block()
+            key = p.encode("ascii").ljust(KEY_WIDTH, b"\0")
+            if not data:
+                table += ZIDX_BLOCK.pack(offset, count, key)
+
+            keys += key
+            data.append(b_id)
+            data.append(c_id)
+
+            prev = p
+            count += 1
+
+        if data:
+            flush_block()
+
+        f.write(table)
+        f.seek(0)
+        f.write(ZIDX_HEADER.pack(
+            ZIDX_MAGIC, ZIDX_VERSION, ZIDX_BLOCK_RECORDS, count, offset, zlib.crc32(table), blocks_crc
+        ))
+
+    blocks = len(table) // ZIDX_BLOCK.size
+    print(f"postcodes.zidx written ({count} postcodes in {blocks} blocks, "
+          f"{raw_size} bytes compressed to {offset - ZIDX_HEADER.size}).")
+
+# Keys per postcodes_phf.bin bucket on average (layout in
+# postcode_formats.py): fewer leaves fewer multi-key buckets to place once
+# the table is nearly full, at 8 bytes per extra bucket
+PHF_BUCKET_LOAD = 3
+# Buckets and slots per postcodes_phf.bin checksum block
+PHF_BLOCK_ENTRIES = 1024
+PHF_MAX_ATTEMPTS = 100000
+# Random d1 tried for one d0 before moving on to the next
+PHF_AIMS_PER_D0 = 64
+
+def to_le_bytes(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def place_buckets(postcodes, seed, bucket_count):
+    """
+    Hash-and-displace (CHD): buckets are placed largest first, each one
+    given a displacement (d0, d1) that lands all of its keys on free
+    slots. d0 scales each key's second hash word, so keys of one bucket
+    that collide for one d0 come apart for another; d1 shifts the bucket
+    as a whole. Returns (displacements, slot of every key, fingerprint of
+    every slot), or None in the rare case this seed cannot work and the
+    caller should retry with another.
+    """
+    m = len(postcodes)
+    buckets = [[] for _ in range(bucket_count)]
+    key_fingerprints = array("I", [0]) * m
+    for i, p in enumerate(postcodes):
+        h0, h1, h2, key_fingerprints[i] = phf_hash(p, seed)
+        buckets[h0 % bucket_count].append((h1, h2, i))
+
+    rng = random.Random(seed)
+    taken = bytearray(m)
+    free = list(range(m))
+    free_pos = list(range(m))
+    displacements = array("I", [0]) * (bucket_count * 2)
+    slot_of = [0] * m
+    fingerprints = array("I", [0]) * m
+
+    for b in sorted(range(bucket_count), key=lambda b: len(buckets[b]), reverse=True):
+        items = buckets[b]
+        if not items:
+            break
+
+        # For each d0 that keeps the bucket's keys apart, aim the first
+        # key at a random free slot and check the rest fit
+        placed = None
+        for d0 in range(PHF_MAX_ATTEMPTS // PHF_AIMS_PER_D0):
+            positions = [phf_slot(h1, h2, d0, 0, m) for h1, h2, _ in items]
+            if len(set(positions)) != len(positions):
+                continue
+            for _ in range(PHF_AIMS_PER_D0):
+                # The first key lands on a free slot by construction
+                d1 = (free[int(rng.random() * len(free))] - positions[0]) % m
+                slots = [(pos + d1) % m for pos in positions]
+                if not any(taken[s] for s in slots[1:]):
+                    placed = slots
+                    break
+            if placed:
+                break
+        if placed is None:
+            return None
+
+        for s, (_, _, i) in zip(placed, items):
+            taken[s] = 1
+            slot_of[i] = s
+            fingerprints[s] = key_fingerprints[i]
+
+            # Swap-remove s from the free list
+            last = free.pop()
+            if last != s:
+                free[free_pos[s]] = last
+                free_pos[last] = free_pos[s]
+
+        displacements[b * 2] = d0
+        displacements[b * 2 + 1] = d1
+
+    return displacements, slot_of, fingerprints
+
+def build_perfect_hash(postcodes, brma_id_list, country_id_list, seed=1):
+    """
+    Write postcodes_phf.bin: a minimal perfect hash over the normalised
+    postcodes. Each slot stores a 32-bit fingerprint (to reject postcodes
+    that are not in the table) and the 2-byte BRMA/country payload, so a
+    lookup is one hash, one displacement read and one slot read.
+    """
+    base_dir = OUT_DIR
+    phf_path = os.path.join(base_dir, "postcodes_phf.bin")
+
+    print("\nBuilding minimal perfect hash:", phf_path)
+
+    # A hash table cannot hold a postcode twice; lookups only ever see the
+    # first of a repeated postcode, so keep that one
+    postcodes = list(postcodes)
+    keep = [i for i, p in enumerate(postcodes) if i == 0 or p != postcodes[i - 1]]
+    if len(keep) != len(postcodes):
+        postcodes = [postcodes[i] for i in keep]
+        brma_id_list = [brma_id_list[i] for i in keep]
+        country_id_list = [country_id_list[i] for i in keep]
+
+    m = len(postcodes)
+    bucket_count = max(1, -(-m // PHF_BUCKET_LOAD))
+
+    while True:
+        placed = place_buckets(postcodes, seed, bucket_count)
+        if placed:
+            break
+        print(f"Seed {seed} failed, retrying")
+        seed += 1
+
+    displacements, slot_of, fingerprints = placed
+
+    payload = bytearray(m * 2)
+    for i, s in enumerate(slot_of):
+        payload[s * 2] = brma_id_list[i]
+        payload[s * 2 + 1] = country_id_list[i]
+
+    displacements = to_le_bytes(displacements)
+    fingerprints = to_le_bytes(fingerprints)
+
+    # One CRC32 per block of displacements, then per block of slots over
+    # its fingerprints and payload
+    tables = array("I")
+    step = PHF_BLOCK_ENTRIES * 8
+    for start in range(0, len(displacements), step):
+        tables.append(zlib.crc32(displacements[start:start + step]))
+    for start in range(0, m, PHF_BLOCK_ENTRIES):
+        end = min(start + PHF_BLOCK_ENTRIES, m)
+        tables.append(zlib.crc32(payload[start * 2:end * 2], zlib.crc32(fingerprints[start * 4:end * 4])))
+    tables = to_le_bytes(tables)
+
+    with open(phf_path, "wb") as f:
+        f.write(PHF_HEADER.pack(PHF_MAGIC, PHF_VERSION, PHF_BLOCK_ENTRIES, m, bucket_count, seed, zlib.crc32(tables)))
+        f.write(tables)
+        f.write(displacements)
+        f.write(fingerprints)
+        f.write(payload)
+
+    print(f"postcodes_phf.bin written (seed {seed}).")
+
+def build_in_memory(workers):
+    timer = PhaseTimer()
+
+    with timer.phase("load and sort"):
+        print("Loading and sorting postcodes...")
+        postcodes, brma_list, country_list, brma_name_map = load_and_sort_postcodes()
 
     print("Total postcodes loaded:", len(postcodes))
     print("First 5:", postcodes[:5])
     print("Last 5:", postcodes[-5:])
     print("Done loading.\n")
 
-    build_compact_files(postcodes, brma_list, country_list, brma_name_map)
+    with timer.phase("compact files"):
+        brma_id_list, country_id_list = build_compact_files(
+            postcodes, brma_list, country_list, brma_name_map, workers=workers
+        )
+    with timer.phase("fixed-width index"):
+        build_fixed_width_index(zip(postcodes, brma_id_list, country_id_list))
+    with timer.phase("area shards"):
+        build_postcode_shards(postcodes, brma_id_list, country_id_list)
+    with timer.phase("perfect hash"):
+        build_perfect_hash(postcodes, brma_id_list, country_id_list)
+    with timer.phase("packed keys"):
+        build_packed_keys(zip(postcodes, brma_id_list, country_id_list))
+    with timer.phase("compressed index"):
+        build_compressed_index(zip(postcodes, brma_id_list, country_id_list))
+
+    timer.report()
+
+def build_streaming(chunk_size, workers):
+    """
+    Bounded-memory build: sorted runs of chunk_size rows are spilled to a
+    temp directory and merged straight into the writers, once per output.
+    Shards and the perfect hash need every postcode in memory at once, so
+    they are not built; any left by an earlier build are deleted rather
+    than shipped alongside files from a different dataset.
+    """
+    timer = PhaseTimer()
+
+    base_dir = OUT_DIR
+    for name in ("postcodes_phf.bin", "shards"):
+        path = os.path.join(base_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        else:
+            continue
+        print("Removed stale", path)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with timer.phase("spill sorted runs"):
+            print(f"Spilling sorted runs of {chunk_size} rows...")
+            run_paths, brma_name_map = spill_sorted_runs(tmp_dir, chunk_size)
+            print(f"{len(run_paths)} runs written.")
+
+        with timer.phase("merge: compact files"):
+            if workers > 1:
+                brma_dict, country_dict = write_compact_files_parallel(merge_runs(run_paths), brma_name_map, workers)
+            else:
+                brma_dict, country_dict = write_compact_files(merge_runs(run_paths), brma_name_map)
+        with timer.phase("merge: fixed-width index"):
+            build_fixed_width_index(
+                (p, brma_dict[brma], country_dict[country]) for p, brma, country in merge_runs(run_paths)
+            )
+        with timer.phase("merge: packed keys"):
+            build_packed_keys(
+                (p, brma_dict[brma], country_dict[country]) for p, brma, country in merge_runs(run_paths)
+            )
+        with timer.phase("merge: compressed index"):
+            build_compressed_index(
+                (p, brma_dict[brma], country_dict[country]) for p, brma, country in merge_runs(run_paths)
+            )
+
+    print("Shards and perfect hash skipped in streaming mode (run without --streaming to build them).")
+
+    timer.report()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the compact postcode files from the cleaned ONS CSV.")
+    parser.add_argument("--csv", default=CSV_PATH, help="cleaned CSV to build from (default: %(default)s)")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="directory to write the files to (default: %(default)s)")
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="external merge sort: bounded memory regardless of CSV size"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=500000,
+        help="rows per sorted run in --streaming mode (default: 500000)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="encode postcodes.idx/postcodes_data.bin in N processes, partitioned by postcode area"
+    )
+    args = parser.parse_args()
+
+    CSV_PATH = args.csv
+    OUT_DIR = args.out_dir
+    os.makedirs(OUT_DIR, exist_ok=True)
+    if args.streaming:
+        build_streaming(args.chunk_size, args.workers)
+    else:
+        build_in_memory(args.workers)
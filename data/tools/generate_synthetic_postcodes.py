@@ -0,0 +1,202 @@
+import argparse
+import csv
+import math
+import os
+import random
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", ".."))
+OUT_PATH = os.path.join(DATA_DIR, "data", "pcode_brma_lookup_synthetic.csv")
+
+# Great Britain postcode areas: (area, country, districts, weight).
+# weight is the approximate number of postcode units in the area, in
+# thousands, so rows are spread across areas as they are in the ONS file.
+AREAS = [
+    ("AB", "S", 39, 17), ("AL", "E", 10, 6), ("B", "E", 79, 47), ("BA", "E", 22, 16),
+    ("BB", "E", 18, 13), ("BD", "E", 24, 17), ("BH", "E", 25, 17), ("BL", "E", 9, 9),
+    ("BN", "E", 45, 28), ("BR", "E", 8, 8), ("BS", "E", 49, 31), ("CA", "E", 28, 13),
+    ("CB", "E", 25, 12), ("CF", "W", 48, 24), ("CH", "E", 50, 21), ("CM", "E", 27, 19),
+    ("CO", "E", 16, 11), ("CR", "E", 9, 7), ("CT", "E", 21, 14), ("CV", "E", 47, 22),
+    ("CW", "E", 14, 11), ("DA", "E", 18, 11), ("DD", "S", 11, 8), ("DE", "E", 75, 26),
+    ("DG", "S", 16, 7), ("DH", "E", 9, 7), ("DL", "E", 17, 12), ("DN", "E", 41, 26),
+    ("DT", "E", 11, 9), ("DY", "E", 14, 12), ("E", "E", 20, 20), ("EC", "E", 4, 4),
+    ("EH", "S", 55, 25), ("EN", "E", 11, 9), ("EX", "E", 39, 22), ("FK", "S", 21, 12),
+    ("FY", "E", 8, 8), ("G", "S", 83, 37), ("GL", "E", 56, 24), ("GU", "E", 35, 23),
+    ("HA", "E", 9, 8), ("HD", "E", 9, 7), ("HG", "E", 5, 5), ("HP", "E", 23, 13),
+    ("HR", "E", 9, 6), ("HS", "S", 9, 1), ("HU", "E", 20, 11), ("HX", "E", 7, 5),
+    ("IG", "E", 11, 7), ("IP", "E", 33, 19), ("IV", "S", 53, 11), ("KA", "S", 30, 13),
+    ("KT", "E", 24, 15), ("KW", "S", 17, 3), ("KY", "S", 16, 12), ("L", "E", 56, 31),
+    ("LA", "E", 23, 11), ("LD", "W", 8, 2), ("LE", "E", 67, 30), ("LL", "W", 78, 22),
+    ("LN", "E", 13, 9), ("LS", "E", 29, 23), ("LU", "E", 7, 7), ("M", "E", 60, 36),
+    ("ME", "E", 20, 14), ("MK", "E", 46, 14), ("ML", "S", 12, 9), ("N", "E", 22, 19),
+    ("NE", "E", 74, 37), ("NG", "E", 34, 33), ("NN", "E", 18, 18), ("NP", "W", 26, 15),
+    ("NR", "E", 35, 25), ("NW", "E", 11, 11), ("OL", "E", 16, 12), ("OX", "E", 32, 20),
+    ("PA", "S", 65, 12), ("PE", "E", 37, 30), ("PH", "S", 50, 9), ("PL", "E", 33, 16),
+    ("PO", "E", 42, 24), ("PR", "E", 26, 17), ("RG", "E", 45, 24), ("RH", "E", 20, 15),
+    ("RM", "E", 20, 13), ("S", "E", 81, 44), ("SA", "W", 73, 31), ("SE", "E", 28, 25),
+    ("SG", "E", 19, 13), ("SK", "E", 23, 19), ("SL", "E", 9, 10), ("SM", "E", 7, 5),
+    ("SN", "E", 16, 15), ("SO", "E", 45, 20), ("SP", "E", 11, 8), ("SR", "E", 9, 7),
+    ("SS", "E", 17, 14), ("ST", "E", 21, 23), ("SW", "E", 20, 20), ("SY", "E", 25, 13),
+    ("TA", "E", 24, 14), ("TD", "S", 15, 6), ("TF", "E", 13, 7), ("TN", "E", 40, 24),
+    ("TQ", "E", 14, 10), ("TR", "E", 27, 12), ("TS", "E", 29, 18), ("TW", "E", 20, 13),
+    ("UB", "E", 11, 8), ("W", "E", 15, 14), ("WA", "E", 16, 15), ("WC", "E", 2, 3),
+    ("WD", "E", 7, 6), ("WF", "E", 17, 14), ("WN", "E", 8, 9), ("WR", "E", 15, 10),
+    ("WS", "E", 15, 11), ("WV", "E", 16, 13), ("YO", "E", 25, 18), ("ZE", "S", 3, 1),
+]
+
+# Areas that cross a border: share of districts (the highest numbered)
+# that belong to the other country
+BORDER_AREAS = {"CH": ("W", 0.15), "SY": ("W", 0.5), "HR": ("W", 0.05), "TD": ("E", 0.15), "LL": ("E", 0.03)}
+
+# Central London districts split into lettered sub-districts (SW1A, EC4M...)
+LETTERED_DISTRICTS = {
+    "EC": {1: "AMNRVY", 2: "AMNPRVY", 3: "AMNPRV", 4: "AMNRVY"},
+    "WC": {1: "ABEHNRVX", 2: "ABEHNR"},
+    "SW": {1: "AEHPVWXY"},
+    "W": {1: "ABCDFGHJKSTUW"},
+}
+
+# Second half of a postcode: sector digit + two letters (no C, I, K, M, O, V)
+INWARD_LETTERS = "ABDEFGHJLNPQRSTUWXYZ"
+UNITS_PER_DISTRICT = 10 * len(INWARD_LETTERS) ** 2
+
+LHA_FILES = {"E": "LHA-England.csv", "S": "LHA-Scotland.csv", "W": "LHA-Wales.csv"}
+
+def load_brmas():
+    """Real BRMA names from the packaged LHA tables, numbered in file order."""
+    brmas = {}
+    code = 0
+    for country, name in LHA_FILES.items():
+        with open(os.path.join(DATA_DIR, "data", name), newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if row and row[0].strip():
+                    code += 1
+                    brmas.setdefault(country, []).append((str(code), row[0].strip()))
+    return brmas
+
+def apportion(total, weights):
+    """Split total into integers proportional to weights (largest remainder)."""
+    weight_sum = sum(weights)
+    shares = [total * w / weight_sum for w in weights]
+    counts = [int(s) for s in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: counts[i] - shares[i])
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+def district_names(area, real_count):
+    """
+    Real-looking districts first, then synthetic ones (lettered
+    sub-districts) for sizes beyond the real postcode space. Keys stay
+    within 7 characters.
+    """
+    names = []
+    for n in range(1, real_count + 1):
+        letters = LETTERED_DISTRICTS.get(area, {}).get(n)
+        if letters:
+            names.extend(f"{n}{c}" for c in letters)
+        else:
+            names.append(str(n))
+
+    seen = set(names)
+    extra = [str(n) for n in range(real_count + 1, 100)]
+    max_digits = 2 if len(area) == 1 else 1
+    extra += [f"{n}{c}" for n in range(1, 10 ** max_digits) for c in INWARD_LETTERS]
+    names.extend(d for d in extra if d not in seen)
+    return names
+
+def split_districts(area, real_count, rows, rng):
+    """Allocate an area's rows to districts, adding districts once real ones are full."""
+    names = district_names(area, real_count)
+    needed = max(real_count, math.ceil(rows / (UNITS_PER_DISTRICT * 0.9)))
+    needed = min(needed, len(names))
+    if rows > needed * UNITS_PER_DISTRICT:
+        raise ValueError(f"{rows} rows do not fit in postcode area {area}")
+
+    names = names[:needed]
+    counts = apportion(rows, [rng.uniform(0.5, 1.5) for _ in names])
+
+    # Move any overflow past a district's capacity onto districts with room
+    spill = 0
+    for i, count in enumerate(counts):
+        if count > UNITS_PER_DISTRICT:
+            spill += count - UNITS_PER_DISTRICT
+            counts[i] = UNITS_PER_DISTRICT
+    for i, count in enumerate(counts):
+        if not spill:
+            break
+        room = min(spill, UNITS_PER_DISTRICT - count)
+        counts[i] += room
+        spill -= room
+
+    return list(zip(names, counts))
+
+def area_rows(area, country, real_count, rows, brmas, rng):
+    """Yield (country, postcode, brma, brma_name) rows for one area."""
+    districts = split_districts(area, real_count, rows, rng)
+
+    other_country, other_share = BORDER_AREAS.get(area, (None, 0))
+    cutover = len(districts) - round(len(districts) * other_share) if other_country else len(districts)
+
+    # A handful of BRMAs per area, contiguous runs of districts sharing one
+    area_brmas = {}
+    for c in sorted({country, other_country} - {None}):
+        area_brmas[c] = rng.sample(brmas[c], min(len(brmas[c]), rng.randint(1, 4)))
+
+    for i, (district, count) in enumerate(districts):
+        if not count:
+            continue
+        c = country if i < cutover else other_country
+        choices = area_brmas[c]
+        code, name = choices[i * len(choices) // len(districts)]
+
+        outward = area + district
+        for unit in rng.sample(range(UNITS_PER_DISTRICT), count):
+            sector, letters = divmod(unit, len(INWARD_LETTERS) ** 2)
+            inward = f"{sector}{INWARD_LETTERS[letters // len(INWARD_LETTERS)]}{INWARD_LETTERS[letters % len(INWARD_LETTERS)]}"
+            yield c, f"{outward} {inward}", code, name
+
+def generate(out_path, total, seed=1, sort=False):
+    rng = random.Random(seed)
+    brmas = load_brmas()
+    counts = apportion(total, [weight for _, _, _, weight in AREAS])
+
+    areas = sorted(zip(AREAS, counts))
+    if not sort:
+        rng.shuffle(areas)
+
+    start = time.perf_counter()
+    written = 0
+    with open(out_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(["country", "PCD", "brma", "brma_name"])
+
+        for (area, country, real_count, _), rows in areas:
+            batch = list(area_rows(area, country, real_count, rows, brmas, rng))
+            if sort:
+                # Every postcode in an area sorts after the previous area's,
+                # so sorting per area gives a globally sorted file
+                batch.sort(key=lambda r: r[1].replace(" ", ""))
+            writer.writerows(batch)
+            written += len(batch)
+
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} rows to {out_path} in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic postcode/BRMA/country CSV in the cleaned ONS layout."
+    )
+    parser.add_argument("rows", type=int, help="number of rows, e.g. 1000 or 50000000")
+    parser.add_argument("--out", default=OUT_PATH, help="CSV to write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--sorted", action="store_true",
+        help="write rows sorted by postcode (default: shuffled by area and district, like an unsorted extract)"
+    )
+    args = parser.parse_args()
+
+    generate(args.out, args.rows, args.seed, args.sorted)
@@ -1,8 +1,18 @@
+import argparse
 import os
 import csv
+import sys
+import mmap
 import time
 import bisect
 import json
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from build_postcode_files import merge_runs
+# build_postcode_files has put the repo root on sys.path
+from postcode_formats import COMPACT_HEADER, COMPACT_RESTART, block_checksum, compact_blocks, read_compact_header
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 IDX_PATH = os.path.join(BASE_DIR, "postcodes.idx")
@@ -22,12 +32,12 @@ def load_data():
         return f.read()
 
 def reconstruct_all_postcodes(idx_bytes):
-    postcodes = []
-    pos = 0
+    _, total, table_offset, _, _ = read_compact_header(idx_bytes)
+    postcodes = [None] * total
+    pos = COMPACT_HEADER.size
     prev = ""
-    total = 2936738
 
-    for _ in range(total):
+    for i in range(total):
         prefix_len = idx_bytes[pos]
         suffix_len = idx_bytes[pos + 1]
         pos += 2
@@ -36,48 +46,348 @@ def reconstruct_all_postcodes(idx_bytes):
         pos += suffix_len
 
         postcode = prev[:prefix_len] + suffix
-        postcodes.append(postcode)
+        postcodes[i] = postcode
         prev = postcode
 
+    if pos != table_offset:
+        raise ValueError("postcodes.idx is corrupt (entries do not end at the restart table)")
+
     return postcodes
 
-def validate_fast():
-    print("Loading compact files...")
-    idx_bytes = load_idx()
-    data_bytes = load_data()
-
-    print("Reconstructing all postcodes (one-time)...")
-    start = time.time()
-    all_postcodes = reconstruct_all_postcodes(idx_bytes)
-    end = time.time()
-    print(f"Reconstruction complete in {round(end - start, 2)} seconds")
-
-    print("Loading CSV for validation...")
-    with open(CSV_PATH, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-
-    print("Validating using bisect...")
-    start = time.time()
-    errors = 0
-
-    for i, row in enumerate(rows):
-        pcd = normalise_postcode(row["PCD"])
-
-        idx = bisect.bisect_left(all_postcodes, pcd)
-        if idx >= len(all_postcodes) or all_postcodes[idx] != pcd:
-            print("ERROR: Not found:", pcd)
-            errors += 1
+# ============================================================
+# Streaming validation: CSV and compact index merge-joined
+# ============================================================
+
+MAX_REPORTED = 20
+
+def csv_columns(header):
+    return header.index("PCD"), header.index("brma"), header.index("country")
+
+def parse_line(raw, columns):
+    row = next(csv.reader([raw.decode("utf-8")]))
+    pcd_col, brma_col, country_col = columns
+    return (
+        normalise_postcode(row[pcd_col]),
+        row[brma_col].strip().upper(),
+        row[country_col].strip().upper()
+    )
+
+def iter_csv_range(path, start, end, columns):
+    """Yield (byte offset, postcode, brma, country) for CSV lines in [start, end)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            if offset >= end:
+                break
+            if raw.strip():
+                yield (offset,) + parse_line(raw, columns)
+            offset += len(raw)
+
+def iter_index(idx, data, pos, entry, start_key="", stop_key=None):
+    """
+    Decode postcodes.idx from a restart point, yielding
+    (postcode, brma id, country id, byte offset) for keys in
+    [start_key, stop_key).
+    """
+    _, _, end, _, _ = read_compact_header(idx)
+    prev = ""
+    while pos < end:
+        prefix_len = idx[pos]
+        suffix_len = idx[pos + 1]
+        key = prev[:prefix_len] + idx[pos + 2:pos + 2 + suffix_len].decode("ascii")
+        if stop_key is not None and key >= stop_key:
+            return
+        if key >= start_key:
+            yield key, data[entry * 2], data[entry * 2 + 1], pos
+        pos += 2 + suffix_len
+        prev = key
+        entry += 1
+
+def find_checkpoints(idx, keys):
+    """
+    For each key, the restart point (entry number, byte offset) of the
+    block holding the first entry >= key, from the postcodes.idx table.
+    """
+    _, _, table_offset, _, _ = read_compact_header(idx)
+    table = [
+        COMPACT_RESTART.unpack_from(idx, offset)
+        for offset in range(table_offset, len(idx), COMPACT_RESTART.size)
+    ]
+    first_keys = [key.rstrip(b"\0").decode("ascii") for _, _, _, key in table]
+
+    checkpoints = []
+    for key in keys:
+        block = bisect.bisect_left(first_keys, key) - 1
+        if block < 0:
+            checkpoints.append((0, COMPACT_HEADER.size))
+        else:
+            offset, entry, _, _ = table[block]
+            checkpoints.append((entry, offset))
+    return checkpoints
+
+def merge_join(rows, entries, brma_rev, country_rev, stop_key=None):
+    """
+    Walk sorted CSV rows and index entries in lockstep. Every CSV row must
+    match exactly one index entry, in order, with the same BRMA and country.
+    """
+    result = {
+        "rows": 0, "entries": 0, "missing": 0, "extra": 0, "wrong": 0,
+        "unsorted": None, "messages": []
+    }
+
+    def report(message):
+        if len(result["messages"]) < MAX_REPORTED:
+            result["messages"].append(message)
+
+    entry = next(entries, None)
+    last = ""
+
+    for offset, pcd, brma, country in rows:
+        if pcd < last or (stop_key is not None and pcd >= stop_key):
+            result["unsorted"] = offset
+            return result
+        last = pcd
+        result["rows"] += 1
+
+        while entry is not None and entry[0] < pcd:
+            result["extra"] += 1
+            result["entries"] += 1
+            report(f"Not in CSV: {entry[0]} (index byte {entry[3]})")
+            entry = next(entries, None)
+
+        if entry is None or entry[0] != pcd:
+            result["missing"] += 1
+            report(f"Not found: {pcd} (CSV byte {offset})")
             continue
 
-        if i % 500000 == 0:
-            print(f"Checked {i} rows...")
+        result["entries"] += 1
+        found = (brma_rev.get(entry[1]), country_rev.get(entry[2]))
+        if found != (brma, country):
+            result["wrong"] += 1
+            report(f"Wrong data: {pcd} (CSV byte {offset}, index byte {entry[3]}): "
+                   f"expected {brma}/{country}, found {found[0]}/{found[1]}")
+        entry = next(entries, None)
+
+    while entry is not None:
+        result["extra"] += 1
+        result["entries"] += 1
+        report(f"Not in CSV: {entry[0]} (index byte {entry[3]})")
+        entry = next(entries, None)
+
+    return result
+
+def validate_range(csv_path, start, end, columns, checkpoint, start_key, stop_key):
+    """Worker: validate one CSV byte range against its slice of the index."""
+    began = time.perf_counter()
+    brma_rev, country_rev = load_dictionaries()
+
+    with open(IDX_PATH, "rb") as idx_f, open(DATA_PATH, "rb") as data_f, \
+         mmap.mmap(idx_f.fileno(), 0, access=mmap.ACCESS_READ) as idx, \
+         mmap.mmap(data_f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        entry, pos = checkpoint
+        result = merge_join(
+            iter_csv_range(csv_path, start, end, columns),
+            iter_index(idx, data, pos, entry, start_key, stop_key),
+            brma_rev, country_rev, stop_key
+        )
+
+    result["csv_bytes"] = end - start
+    result["seconds"] = time.perf_counter() - began
+    return result
+
+def split_csv(csv_path, parts, columns):
+    """
+    Cut the sorted CSV into up to `parts` byte ranges on line boundaries.
+    A cut is never placed inside a run of equal postcodes, so each range
+    owns the keys [first key, next range's first key). Returns
+    (header end, [(start, end, first key)]).
+    """
+    size = os.path.getsize(csv_path)
+    cuts = []
+
+    with open(csv_path, "rb") as f:
+        f.readline()
+        data_start = f.tell()
+
+        for i in range(1, parts):
+            f.seek(max(data_start, size * i // parts))
+            f.readline()
+            line = f.readline()
+            if not line:
+                break
+            key = parse_line(line, columns)[0]
+            while True:
+                cut = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                next_key = parse_line(line, columns)[0]
+                if next_key != key:
+                    if not cuts or cut > cuts[-1][0]:
+                        cuts.append((cut, next_key))
+                    break
+
+    starts = [(data_start, "")] + cuts
+    ranges = []
+    for i, (start, key) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else size
+        ranges.append((start, end, key))
+    return data_start, ranges
+
+def check_index_header(idx, data):
+    """
+    Whole-file checks against the postcodes.idx header, and every block
+    against its CRC32: (count, problems).
+    """
+    problems = []
+    _, count, table_offset, checksum, _ = read_compact_header(idx)
+    if zlib.crc32(idx[COMPACT_HEADER.size:]) != checksum:
+        problems.append("postcodes.idx checksum mismatch")
+    if len(data) != count * 2:
+        problems.append(f"postcodes_data.bin holds {len(data) // 2} records, postcodes.idx header says {count}")
+        return count, problems
 
-    end = time.time()
+    for block, offset, end_offset, entry, end_entry, crc in compact_blocks(idx, count, table_offset):
+        actual = block_checksum(idx, data, offset, end_offset, entry, end_entry)
+        if actual != crc and len(problems) < MAX_REPORTED:
+            problems.append(
+                f"block {block} checksum mismatch (index bytes {offset}-{end_offset}, "
+                f"data bytes {entry * 2}-{end_entry * 2})"
+            )
+    return count, problems
+
+def print_validation(results, idx_size, data_size, seconds, count, problems):
+    rows = sum(r["rows"] for r in results)
+    entries = sum(r["entries"] for r in results)
+    missing = sum(r["missing"] for r in results)
+    extra = sum(r["extra"] for r in results)
+    wrong = sum(r["wrong"] for r in results)
+    csv_bytes = sum(r["csv_bytes"] for r in results)
+
+    for r in results:
+        for message in r["messages"]:
+            print("ERROR:", message)
+
+    if entries != count:
+        problems.append(f"decoded {entries} index entries, postcodes.idx header says {count}")
+    for problem in problems:
+        print("ERROR:", problem)
 
     print("\nValidation complete.")
-    print("Errors:", errors)
-    print("Time:", round(end - start, 2), "seconds")
+    print(f"CSV rows: {rows}  Index entries: {entries}")
+    print(f"Missing: {missing}  Not in CSV: {extra}  Wrong data: {wrong}")
+
+    if len(results) > 1:
+        for i, r in enumerate(results):
+            rate = r["rows"] / r["seconds"] if r["seconds"] else 0
+            print(f"  worker {i}: {r['rows']} rows in {r['seconds']:.2f}s ({rate:,.0f} rows/s)")
+
+    mb = (csv_bytes + idx_size + data_size) / (1 << 20)
+    print(f"Time: {seconds:.2f}s  "
+          f"{rows / seconds if seconds else 0:,.0f} rows/s  "
+          f"{mb / seconds if seconds else 0:.1f} MB/s")
+
+    errors = missing + extra + wrong + len(problems)
+    return errors, (rows / seconds if seconds else 0)
+
+def validate_fast(csv_path=None, workers=1):
+    """
+    Stream the sorted CSV and postcodes.idx side by side in `workers`
+    processes, each owning one key range. O(n), no reconstruction.
+    Returns (errors, rows per second), or None if the CSV is not sorted.
+    """
+    csv_path = csv_path or CSV_PATH
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        columns = csv_columns(next(csv.reader(f)))
+
+    began = time.perf_counter()
+    _, ranges = split_csv(csv_path, workers, columns)
+
+    keys = [key for _, _, key in ranges]
+    if keys != sorted(keys):
+        print("ERROR: CSV is not sorted by postcode; re-run with --sort")
+        return None
+
+    with open(IDX_PATH, "rb") as idx_f, open(DATA_PATH, "rb") as data_f, \
+         mmap.mmap(idx_f.fileno(), 0, access=mmap.ACCESS_READ) as idx, \
+         mmap.mmap(data_f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        idx_size, data_size = len(idx), len(data)
+        count, problems = check_index_header(idx, data)
+        checkpoints = find_checkpoints(idx, keys)
+
+    print(f"Validating {csv_path} in {len(ranges)} range(s)...")
+    jobs = [
+        (csv_path, start, end, columns, checkpoints[i], key,
+         ranges[i + 1][2] if i + 1 < len(ranges) else None)
+        for i, (start, end, key) in enumerate(ranges)
+    ]
+
+    if len(jobs) == 1:
+        results = [validate_range(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(len(jobs)) as pool:
+            results = list(pool.map(validate_range, *zip(*jobs)))
+
+    for r in results:
+        if r["unsorted"] is not None:
+            print(f"ERROR: CSV is not sorted by postcode at byte {r['unsorted']}; re-run with --sort")
+            return None
+
+    return print_validation(results, idx_size, data_size, time.perf_counter() - began, count, problems)
+
+def spill_runs_with_offsets(csv_path, tmp_dir, chunk_size):
+    """Like the builder's spill_sorted_runs, carrying each row's CSV byte offset."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        columns = csv_columns(next(csv.reader(f)))
+
+    run_paths = []
+    chunk = []
+
+    def spill():
+        chunk.sort(key=lambda x: x[0])
+        path = os.path.join(tmp_dir, f"run_{len(run_paths):05d}.tsv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.writelines(f"{p}\t{brma}\t{country}\t{offset}\n" for p, brma, country, offset in chunk)
+        run_paths.append(path)
+        chunk.clear()
+
+    with open(csv_path, "rb") as f:
+        f.readline()
+        start = f.tell()
+    for offset, pcd, brma, country in iter_csv_range(csv_path, start, os.path.getsize(csv_path), columns):
+        chunk.append((pcd, brma, country, offset))
+        if len(chunk) >= chunk_size:
+            spill()
+    if chunk:
+        spill()
+
+    return run_paths
+
+def validate_unsorted(csv_path=None, chunk_size=500000):
+    """External-sort the CSV (as the streaming build does), then merge-join in one pass."""
+    csv_path = csv_path or CSV_PATH
+    began = time.perf_counter()
+    brma_rev, country_rev = load_dictionaries()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("Sorting CSV:", csv_path)
+        run_paths = spill_runs_with_offsets(csv_path, tmp_dir, chunk_size)
+        rows = ((int(r[3]), r[0], r[1], r[2]) for r in merge_runs(run_paths))
+
+        print("Validating merged runs...")
+        with open(IDX_PATH, "rb") as idx_f, open(DATA_PATH, "rb") as data_f, \
+             mmap.mmap(idx_f.fileno(), 0, access=mmap.ACCESS_READ) as idx, \
+             mmap.mmap(data_f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            idx_size, data_size = len(idx), len(data)
+            count, problems = check_index_header(idx, data)
+            result = merge_join(rows, iter_index(idx, data, COMPACT_HEADER.size, 0), brma_rev, country_rev)
+
+    result["csv_bytes"] = os.path.getsize(csv_path)
+    seconds = time.perf_counter() - began
+    result["seconds"] = seconds
+    return print_validation([result], idx_size, data_size, seconds, count, problems)
 
 def load_dictionaries():
     with open(os.path.join(BASE_DIR, "brma_dict.json"), "r", encoding="utf-8") as f:
@@ -115,16 +425,48 @@ def lookup_postcode(pcd, all_postcodes, data_bytes, brma_rev, country_rev, brma_
     }
 
 if __name__ == "__main__":
-    validate_fast()
+    parser = argparse.ArgumentParser(description="Validate the compact postcode files against the cleaned CSV.")
+    parser.add_argument("--csv", default=CSV_PATH, help="cleaned CSV to validate against")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="validate N key ranges in parallel (sorted CSV only)"
+    )
+    parser.add_argument(
+        "--sort", action="store_true",
+        help="external-sort an unsorted CSV first (single merge-join pass)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=500000, help="rows per sorted run with --sort")
+    parser.add_argument(
+        "--min-rows-per-sec", type=float, default=0,
+        help="fail if validation throughput drops below this"
+    )
+    parser.add_argument("--skip-lookup", action="store_true", help="skip the manual lookup test")
+    args = parser.parse_args()
 
-    print("\n--- Manual lookup test ---")
-    brma_rev, country_rev = load_dictionaries()
-    brma_names = load_brma_names()
+    if args.sort:
+        outcome = validate_unsorted(args.csv, args.chunk_size)
+    else:
+        outcome = validate_fast(args.csv, args.workers)
+
+    if outcome is None:
+        sys.exit(2)
+    errors, rate = outcome
+
+    if not args.skip_lookup:
+        print("\n--- Manual lookup test ---")
+        brma_rev, country_rev = load_dictionaries()
+        brma_names = load_brma_names()
+
+        idx_bytes = load_idx()
+        data_bytes = load_data()
+        all_postcodes = reconstruct_all_postcodes(idx_bytes)
 
-    idx_bytes = load_idx()
-    data_bytes = load_data()
-    all_postcodes = reconstruct_all_postcodes(idx_bytes)
+        for test_pcd in ["AB101AA", "SW1A1AA", "ZE39XP"]:
+            result = lookup_postcode(test_pcd, all_postcodes, data_bytes, brma_rev, country_rev, brma_names)
+            print(test_pcd, "→", result)
 
-    for test_pcd in ["AB101AA", "SW1A1AA", "ZE39XP"]:
-        result = lookup_postcode(test_pcd, all_postcodes, data_bytes, brma_rev, country_rev, brma_names)
-        print(test_pcd, "→", result)
+    if rate < args.min_rows_per_sec:
+        print(f"ERROR: throughput {rate:,.0f} rows/s is below {args.min_rows_per_sec:,.0f}")
+        sys.exit(1)
+    if errors:
+        sys.exit(1)
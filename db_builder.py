@@ -2,8 +2,22 @@ import sqlite3
 import csv
 import os
 import re
+import time
 import zlib
 
+from postcode_keys import KEY_WIDTH, pack_postcode
+
+# Rows handed to executemany at a time
+INSERT_BATCH_SIZE = 50000
+
+# postcodes table layouts, recorded in PRAGMA user_version so a reader
+# can tell them apart:
+#   "hash"   (0) rowid table of CRC32 hash, postcode text and ids, with a
+#                non-unique index on the hash
+#   "packed" (1) WITHOUT ROWID table clustered on the packed integer
+#                postcode, ids stored inline: one B-tree, one descent
+SCHEMA_VERSIONS = {"hash": 0, "packed": 1}
+
 def clean_brma(value):
     if value is None:
         return ""
@@ -14,8 +28,19 @@ def clean_brma(value):
 def normalise(p):
     return p.replace(" ", "").upper().strip()
 
-def build_database(csv_path, db_path):
-    print(">>> USING HASH BUILDER WITH BRMA CODE <<<")
+def build_database(csv_path, db_path, batch_size=INSERT_BATCH_SIZE, schema="hash"):
+    """
+    Build postcodes.db from the cleaned CSV with the given postcodes
+    table layout (see SCHEMA_VERSIONS). The file is thrown away if the
+    build fails, so durability is switched off while loading: no
+    journal, no fsync. Rows go in through executemany in batches of
+    batch_size, and the index is created once all rows are in, as one
+    sort rather than millions of incremental B-tree inserts.
+    """
+    if schema not in SCHEMA_VERSIONS:
+        raise ValueError(f"Unknown postcodes.db schema {schema!r}; expected one of {sorted(SCHEMA_VERSIONS)}")
+
+    print(f">>> USING {schema.upper()} BUILDER WITH BRMA CODE <<<")
 
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
@@ -25,39 +50,74 @@ def build_database(csv_path, db_path):
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
 
+    cur.execute("PRAGMA synchronous=OFF;")
+    cur.execute("PRAGMA journal_mode=OFF;")
+    cur.execute("PRAGMA cache_size=-65536;")
+
     # Dictionary tables
     cur.execute("CREATE TABLE brma_dict (id INTEGER PRIMARY KEY, name TEXT UNIQUE);")
     cur.execute("CREATE TABLE country_dict (id INTEGER PRIMARY KEY, code TEXT UNIQUE);")
 
-    # Postcodes stored as hash + original text
-    cur.execute("""
-        CREATE TABLE postcodes (
-            pcd_hash INTEGER,
-            pcd TEXT,
-            brma_id INTEGER,
-            country_id INTEGER,
-            FOREIGN KEY(brma_id) REFERENCES brma_dict(id),
-            FOREIGN KEY(country_id) REFERENCES country_dict(id)
-        );
-    """)
-
-    # Unique index on hash (not primary key)
-    cur.execute("CREATE INDEX idx_postcodes_hash ON postcodes(pcd_hash);")
+    if schema == "packed":
+        # Postcodes stored as their packed integer key, which is the
+        # table's own B-tree key
+        cur.execute("""
+            CREATE TABLE postcodes (
+                pcd_key INTEGER PRIMARY KEY,
+                brma_id INTEGER,
+                country_id INTEGER,
+                FOREIGN KEY(brma_id) REFERENCES brma_dict(id),
+                FOREIGN KEY(country_id) REFERENCES country_dict(id)
+            ) WITHOUT ROWID;
+        """)
+        # Repeated postcodes keep their first row, as the compact files do
+        insert_sql = "INSERT OR IGNORE INTO postcodes (pcd_key, brma_id, country_id) VALUES (?, ?, ?)"
+    else:
+        # Postcodes stored as hash + original text
+        cur.execute("""
+            CREATE TABLE postcodes (
+                pcd_hash INTEGER,
+                pcd TEXT,
+                brma_id INTEGER,
+                country_id INTEGER,
+                FOREIGN KEY(brma_id) REFERENCES brma_dict(id),
+                FOREIGN KEY(country_id) REFERENCES country_dict(id)
+            );
+        """)
+        insert_sql = "INSERT INTO postcodes (pcd_hash, pcd, brma_id, country_id) VALUES (?, ?, ?, ?)"
+    cur.execute(f"PRAGMA user_version={SCHEMA_VERSIONS[schema]};")
 
     brma_cache = {}
     country_cache = {}
 
     skipped_rows = []
 
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            pcd = normalise(row["PCD"])
-            pcd_hash = zlib.crc32(pcd.encode("ascii"))
+    batch = []
+    read = 0
+    rows = 0
+    start = time.perf_counter()
 
-            brma_code = row["brma"].strip().upper()
-            country = row["country"].strip().upper()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        # Plain rows indexed by column position: a dict per row costs
+        # more than the insert itself
+        reader = csv.reader(f)
+        header = next(reader)
+        pcd_col = header.index("PCD")
+        brma_col = header.index("brma")
+        country_col = header.index("country")
+
+        for line, row in enumerate(reader, start=2):
+            pcd = normalise(row[pcd_col])
+            if schema == "packed":
+                pcd_key = pack_postcode(pcd)
+                if pcd_key is None:
+                    skipped_rows.append(
+                        f"line {line}: {pcd!r} cannot be packed (over {KEY_WIDTH} characters or not 0-9/A-Z)"
+                    )
+                    continue
+
+            brma_code = row[brma_col].strip().upper()
+            country = row[country_col].strip().upper()
 
             # Insert BRMA code
             if brma_code not in brma_cache:
@@ -69,11 +129,33 @@ def build_database(csv_path, db_path):
                 cur.execute("INSERT INTO country_dict (code) VALUES (?)", (country,))
                 country_cache[country] = cur.lastrowid
 
-            # Insert postcode row
-            cur.execute(
-                "INSERT INTO postcodes (pcd_hash, pcd, brma_id, country_id) VALUES (?, ?, ?, ?)",
-                (pcd_hash, pcd, brma_cache[brma_code], country_cache[country])
-            )
+            if schema == "packed":
+                batch.append((pcd_key, brma_cache[brma_code], country_cache[country]))
+            else:
+                pcd_hash = zlib.crc32(pcd.encode("ascii"))
+                batch.append((pcd_hash, pcd, brma_cache[brma_code], country_cache[country]))
+            if len(batch) >= batch_size:
+                read += len(batch)
+                cur.executemany(insert_sql, batch)
+                # Counts only rows actually written: INSERT OR IGNORE
+                # drops repeated postcodes
+                rows += cur.rowcount
+                batch.clear()
+
+    read += len(batch)
+    cur.executemany(insert_sql, batch)
+    rows += cur.rowcount
+
+    load_seconds = time.perf_counter() - start
+    print(f"Inserted {rows} rows in {load_seconds:.1f}s ({read / max(load_seconds, 1e-9):,.0f} rows/sec read)")
+    if read != rows:
+        print(f"Dropped {read - rows} repeated postcodes (first row kept)")
+
+    if schema == "hash":
+        # Index on hash (not primary key), built in one pass over the loaded rows
+        start = time.perf_counter()
+        cur.execute("CREATE INDEX idx_postcodes_hash ON postcodes(pcd_hash);")
+        print(f"Indexed in {time.perf_counter() - start:.1f}s")
 
     if skipped_rows:
         log_path = os.path.join("app_data", "skipped_rows.log")
@@ -0,0 +1,232 @@
+# On-disk layouts of the packaged postcode files, shared by the readers in
+# postcode_lookup and the writers and checkers in data/tools. Kept free of
+# kivy, like postcode_keys, so the build scripts can import it.
+
+import hashlib
+import json
+import struct
+import zlib
+
+from postcode_keys import KEY_WIDTH
+
+# ============================================================
+# postcodes.idx + postcodes_data.bin
+# ============================================================
+
+# Layout of postcodes.idx:
+#   header:  magic, version, restart interval, postcode count,
+#            restart-table offset, CRC32 of everything after the header,
+#            CRC32 of the restart table
+#   entries: u8 prefix length, u8 suffix length, suffix; the prefix
+#            length is 0 at every restart point
+#   table:   per restart point, u32 byte offset, u32 entry number, CRC32
+#            of the block (its entries, then its postcodes_data.bin
+#            records) and the first key, NUL-padded to KEY_WIDTH
+COMPACT_MAGIC = b"BBPC"
+COMPACT_VERSION = 3
+COMPACT_HEADER = struct.Struct("<4sHHIIII")
+COMPACT_RESTART = struct.Struct("<III7s")
+
+def read_compact_header(buf, name="postcodes.idx"):
+    """
+    Check the header of postcodes.idx against the buffer it came from and
+    return (interval, count, table_offset, checksum, table_checksum).
+    Raises ValueError for a file without a header, from a newer builder,
+    or truncated.
+    """
+    if len(buf) < COMPACT_HEADER.size:
+        raise ValueError(f"{name} is truncated")
+
+    magic, version, interval, count, table_offset, checksum, table_checksum = COMPACT_HEADER.unpack_from(buf, 0)
+    if magic != COMPACT_MAGIC:
+        raise ValueError(f"{name} has no postcode index header; rebuild it with build_postcode_files.py")
+    if version != COMPACT_VERSION:
+        raise ValueError(f"Unsupported postcodes.idx version {version} in {name}")
+
+    table_size = len(buf) - table_offset
+    if table_offset < COMPACT_HEADER.size or table_size < 0 or table_size % COMPACT_RESTART.size:
+        raise ValueError(f"{name} is truncated")
+    if count and not table_size:
+        raise ValueError(f"{name} is truncated")
+
+    return interval, count, table_offset, checksum, table_checksum
+
+def compact_blocks(buf, count, table_offset):
+    """Yield (block, byte offset, end offset, first entry, end entry, CRC32) from the restart table."""
+    blocks = (len(buf) - table_offset) // COMPACT_RESTART.size
+    for block in range(blocks):
+        offset, entry, crc, _ = COMPACT_RESTART.unpack_from(buf, table_offset + block * COMPACT_RESTART.size)
+        if block + 1 < blocks:
+            end_offset, end_entry, _, _ = COMPACT_RESTART.unpack_from(buf, table_offset + (block + 1) * COMPACT_RESTART.size)
+        else:
+            end_offset, end_entry = table_offset, count
+        yield block, offset, end_offset, entry, end_entry, crc
+
+def block_checksum(idx_buf, data_buf, offset, end_offset, entry, end_entry):
+    return zlib.crc32(data_buf[entry * 2:end_entry * 2], zlib.crc32(idx_buf[offset:end_offset]))
+
+# ============================================================
+# postcodes_fixed.idx
+# ============================================================
+
+# Layout of postcodes_fixed.idx:
+#   header: magic, version, records per block, postcode count, block-table
+#           offset, CRC32 of the block table
+#   keys:   the sorted keys, NUL-padded to KEY_WIDTH, in postcodes_data.bin
+#           order
+#   table:  per block, u32 first entry number, CRC32 of the block (its keys,
+#           then its postcodes_data.bin records) and the first key
+# Like the restart points in postcodes.idx, a block never splits a run of
+# equal postcodes.
+FIXED_MAGIC = b"BBFX"
+FIXED_VERSION = 2
+FIXED_HEADER = struct.Struct("<4sHHIII")
+FIXED_BLOCK = struct.Struct("<II7s")
+
+# ============================================================
+# postcodes_keys.bin
+# ============================================================
+
+# Layout of postcodes_keys.bin:
+#   header: magic, version, records per block, postcode count, CRC32 of
+#           the keys, CRC32 of the block table
+#   keys:   the sorted packed keys (pack_postcode) as little-endian uint64,
+#           in postcodes_data.bin order
+#   table:  per block of that many records, CRC32 of its
+#           postcodes_data.bin records
+PACKED_MAGIC = b"BBPK"
+PACKED_VERSION = 2
+PACKED_HEADER = struct.Struct("<4sHHIII")
+
+def read_block_header(buf, header, magic, version, name):
+    """
+    Unpack a header shared by the block-checked files and check its magic
+    and version. Raises ValueError for a file too short to hold it, of
+    another kind or from another builder version.
+    """
+    if len(buf) < header.size:
+        raise ValueError(f"{name} is truncated")
+    fields = header.unpack_from(buf, 0)
+    if fields[0] != magic:
+        raise ValueError(f"{name} has no postcode file header; rebuild it with build_postcode_files.py")
+    if fields[1] != version:
+        raise ValueError(f"Unsupported version {fields[1]} in {name}")
+    return fields[2:]
+
+# ============================================================
+# brma_table.bin
+# ============================================================
+
+# Layout of brma_table.bin:
+#   header:    magic, version, BRMA count, country count
+#   per BRMA:  u8 length + code, u16 length + name (UTF-8), in id order
+#   per country: u8 length + code, in id order
+STRING_TABLE_MAGIC = b"BBST"
+STRING_TABLE_VERSION = 1
+STRING_TABLE_HEADER = struct.Struct("<4sHHH")
+
+# ============================================================
+# shards/
+# ============================================================
+
+# shards/index.json holds the version, record size, {area: record count}
+# and {area: CRC32 of its shard}; shards/<area>.bin holds that area's
+# sorted records, each the key NUL-padded to KEY_WIDTH, then BRMA id and
+# country id
+SHARD_VERSION = 2
+SHARD_RECORD_SIZE = KEY_WIDTH + 2
+
+def postcode_area(pcd):
+    """Leading letters of a postcode ("SW1A1AA" -> "SW")."""
+    i = 0
+    while i < len(pcd) and pcd[i].isalpha():
+        i += 1
+    return pcd[:i]
+
+# ============================================================
+# postcodes.zidx
+# ============================================================
+
+# Layout of postcodes.zidx:
+#   header: magic, version, records per block, postcode count, block-table
+#           offset, CRC32 of the block table, CRC32 of the blocks
+#   blocks: zlib-compressed, each holding its sorted keys, NUL-padded to
+#           KEY_WIDTH, followed by their BRMA id, country id pairs
+#   table:  per block, u32 byte offset, u32 first entry number and the
+#           first key
+ZIDX_MAGIC = b"BBZI"
+ZIDX_VERSION = 2
+ZIDX_HEADER = struct.Struct("<4sHHIIII")
+ZIDX_BLOCK = struct.Struct("<II7s")
+
+# ============================================================
+# postcodes_phf.bin
+# ============================================================
+
+# Layout of postcodes_phf.bin:
+#   header:       magic, version, buckets and slots per block, slot count,
+#                 bucket count, seed, CRC32 of the block tables
+#   tables:       CRC32 per block of displacements, then CRC32 per block
+#                 of slots (its fingerprints, then its payload)
+#   displacement: u32 d0, u32 d1 per bucket
+#   fingerprints: u32 per slot
+#   payload:      BRMA id, country id per slot
+# A key's slot is (f1 + d0 * f2 + d1) % slots, f1 and f2 from its hash
+# and d0, d1 from its bucket (see phf_slot)
+PHF_MAGIC = b"BBPH"
+PHF_VERSION = 3
+PHF_HEADER = struct.Struct("<4sHHIIII")
+
+def phf_hash(pcd, seed):
+    """128-bit keyed hash split into bucket, f1, f2 and fingerprint words."""
+    h = int.from_bytes(
+        hashlib.blake2b(pcd.encode("ascii"), digest_size=16, key=seed.to_bytes(4, "little")).digest(),
+        "little"
+    )
+    return h & 0xFFFFFFFF, (h >> 32) & 0xFFFFFFFF, (h >> 64) & 0xFFFFFFFF, h >> 96
+
+def phf_slot(h1, h2, d0, d1, slots):
+    """Slot of a key with hash words h1, h2 in a bucket displaced by (d0, d1)."""
+    f2 = h2 % (slots - 1) + 1 if slots > 1 else 1
+    return (h1 % slots + d0 * f2 + d1) % slots
+
+# ============================================================
+# postcodes_delta.json
+# ============================================================
+
+# "base" maps each file below that the delta's base directory held to
+# its fingerprint; the app applies the delta only if the file its index
+# format reads has that fingerprint
+DELTA_VERSION = 3
+
+# Files whose header identifies the dataset: each ends in CRC32s that
+# cover the whole file, and postcodes_data.bin too through the block
+# checksums where the format reads it
+FINGERPRINTED_HEADERS = {
+    "postcodes.idx": (COMPACT_HEADER, COMPACT_MAGIC, COMPACT_VERSION),
+    "postcodes_fixed.idx": (FIXED_HEADER, FIXED_MAGIC, FIXED_VERSION),
+    "postcodes_keys.bin": (PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION),
+    "postcodes.zidx": (ZIDX_HEADER, ZIDX_MAGIC, ZIDX_VERSION),
+    "postcodes_phf.bin": (PHF_HEADER, PHF_MAGIC, PHF_VERSION),
+}
+
+def dataset_fingerprint(name, header):
+    """
+    Identify the packaged dataset from the header of file `name` alone,
+    so no file has to be read past it. None for a header that is short,
+    of another kind or from another format version.
+    """
+    layout, magic, version = FINGERPRINTED_HEADERS[name]
+    if len(header) < layout.size:
+        return None
+    fields = layout.unpack_from(header, 0)
+    if fields[0] != magic or fields[1] != version:
+        return None
+    return ":".join(f"{field:x}" for field in fields[2:])
+
+def shard_fingerprint(directory):
+    """dataset_fingerprint for shards/index.json, from its counts and per-shard CRC32s."""
+    if directory.get("version") != SHARD_VERSION:
+        return None
+    shards = json.dumps([directory["shards"], directory["checksums"]], sort_keys=True)
+    return f"{zlib.crc32(shards.encode('ascii')):08x}"
@@ -0,0 +1,23 @@
+# Postcode keys shared by postcode_lookup, db_builder and the builders in
+# data/tools. Kept free of kivy so the build scripts can import it.
+
+# Normalised UK postcodes are at most 7 characters ("SW1A1AA")
+KEY_WIDTH = 7
+
+# Base 37 over the KEY_WIDTH positions: 0 = padding, then 0-9, then A-Z.
+# Shorter postcodes pad on the right, so integer order equals string
+# order and every key fits in 40 bits.
+PACK_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+PACK_DIGITS = {c: i + 1 for i, c in enumerate(PACK_ALPHABET)}
+
+def pack_postcode(pcd):
+    """Encode a normalised postcode as an integer key, or None if it cannot be one."""
+    if len(pcd) > KEY_WIDTH:
+        return None
+    key = 0
+    for c in pcd:
+        digit = PACK_DIGITS.get(c)
+        if digit is None:
+            return None
+        key = key * 37 + digit
+    return key * 37 ** (KEY_WIDTH - len(pcd))
@@ -1,20 +1,53 @@
 import bisect
+import hashlib
 import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import islice
 from kivy.resources import resource_find
 
+from postcode_keys import KEY_WIDTH, PACK_ALPHABET, pack_postcode
+from postcode_formats import (
+    COMPACT_HEADER, COMPACT_RESTART, block_checksum, compact_blocks, read_compact_header,
+    DELTA_VERSION, FINGERPRINTED_HEADERS, dataset_fingerprint, shard_fingerprint,
+    FIXED_BLOCK, FIXED_HEADER, FIXED_MAGIC, FIXED_VERSION,
+    PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION, read_block_header,
+    PHF_HEADER, PHF_MAGIC, PHF_VERSION, phf_hash, phf_slot,
+    SHARD_RECORD_SIZE, SHARD_VERSION, postcode_area,
+    STRING_TABLE_HEADER, STRING_TABLE_MAGIC, STRING_TABLE_VERSION,
+    ZIDX_BLOCK, ZIDX_HEADER, ZIDX_MAGIC, ZIDX_VERSION,
+)
+
+# numpy is optional: bulk lookups use numpy.searchsorted when it is
+# installed and fall back to bisect otherwise
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # ============================================================
 # Helpers to load packaged files safely on Android
 # ============================================================
 
+def find_packaged(name):
+    return resource_find(f"app_data/postcodes/{name}")
+
 def load_binary(name):
-    path = resource_find(f"app_data/postcodes/{name}")
+    path = find_packaged(name)
     if not path:
         raise FileNotFoundError(f"Missing packaged file: {name}")
     with open(path, "rb") as f:
         return f.read()
 
 def load_json(name):
-    path = resource_find(f"app_data/postcodes/{name}")
+    path = find_packaged(name)
     if not path:
         raise FileNotFoundError(f"Missing packaged file: {name}")
     with open(path, "r", encoding="utf-8") as f:
@@ -24,15 +57,25 @@ def load_json(name):
 # Globals (lazy-loaded)
 # ============================================================
 
-idx_bytes = None
 data_bytes = None
 all_postcodes = None
 brma_dict = None
 country_dict = None
 brma_names = None
+
+# id -> BRMA code / BRMA name / country code, indexed by the ids stored
+# in postcodes_data.bin
 brma_rev = None
+brma_name_rev = None
 country_rev = None
 
+# Active index answering lookup_postcode (see open_postcode_index)
+index = None
+
+# Delta patch applied over the index: postcode -> (brma code, brma name,
+# country), or None for a removed postcode (see load_delta_overlay)
+overlay = None
+
 # ============================================================
 # Normalisation
 # ============================================================
@@ -40,15 +83,41 @@ country_rev = None
 def normalise_postcode(p):
     return p.replace(" ", "").upper().strip()
 
+def encode_fixed_key(pcd):
+    """
+    Encode a normalised postcode as a NUL-padded fixed-width key.
+    NUL sorts before every digit and letter, so byte order of the padded
+    keys matches the string order used by the builder.
+    Returns None for input that can never be in the index.
+    """
+    if len(pcd) > KEY_WIDTH:
+        return None
+    try:
+        return pcd.encode("ascii").ljust(KEY_WIDTH, b"\0")
+    except UnicodeEncodeError:
+        return None
+
 # ============================================================
 # Reconstruct postcode list from compressed index
 # ============================================================
 
+def verify_compact_blocks(idx_bytes, data_bytes):
+    """Check every block of postcodes.idx and postcodes_data.bin against its CRC32."""
+    _, count, table_offset, _, _ = read_compact_header(idx_bytes)
+    if len(data_bytes) != count * 2:
+        raise ValueError("postcodes_data.bin does not match postcodes.idx")
+    for block, *bounds, crc in compact_blocks(idx_bytes, count, table_offset):
+        if block_checksum(idx_bytes, data_bytes, *bounds) != crc:
+            raise ValueError(f"postcodes.idx block {block} is corrupt (checksum mismatch)")
+
 def reconstruct_all_postcodes(idx_bytes, progress_callback=None):
-    total = 2936738
+    _, total, table_offset, checksum, _ = read_compact_header(idx_bytes)
+    if zlib.crc32(memoryview(idx_bytes)[COMPACT_HEADER.size:]) != checksum:
+        raise ValueError("postcodes.idx is corrupt (checksum mismatch)")
+
     postcodes = [None] * total
     ib = idx_bytes
-    pos = 0
+    pos = COMPACT_HEADER.size
     prev = ""
 
     for i in range(total):
@@ -67,75 +136,1295 @@ def reconstruct_all_postcodes(idx_bytes, progress_callback=None):
         if progress_callback and i % 10000 == 0:
             progress_callback(i / total)
 
+    if pos != table_offset:
+        raise ValueError("postcodes.idx is corrupt (entries do not end at the restart table)")
+
     return postcodes
 
+# ============================================================
+# Index implementations
+# ============================================================
+#
+# Every index exposes find(pcd) -> (brma_id, country_id) or None for an
+# already-normalised postcode, so lookup_postcode does not care which
+# on-disk format is in use. Formats that keep postcodes in sorted order
+# also expose iter_from(pcd), used for prefix completion.
+
+class SortedListIndex:
+    """Bisect over the fully reconstructed list of postcodes."""
+
+    def __init__(self, postcodes, data):
+        self.postcodes = postcodes
+        self.data = data
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def find(self, pcd):
+        i = bisect.bisect_left(self.postcodes, pcd)
+        if i >= len(self.postcodes) or self.postcodes[i] != pcd:
+            return None
+        return self.data[i * 2], self.data[i * 2 + 1]
+
+    def iter_from(self, pcd):
+        """Postcodes in sorted order, from the first one >= pcd."""
+        return islice(self.postcodes, bisect.bisect_left(self.postcodes, pcd), None)
+
+    def close(self):
+        pass
+
+class FixedWidthKeys:
+    """
+    Read-only sequence view of fixed-width keys inside a buffer, so
+    bisect can search mapped bytes without copying them into a list.
+    """
+
+    def __init__(self, buf, width, stride=None, offset=0, count=None):
+        self.buf = buf
+        self.width = width
+        self.stride = stride or width
+        self.offset = offset
+        if count is None:
+            count = (len(buf) - offset) // self.stride
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.stride
+        return self.buf[start:start + self.width]
+
+def map_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class MappedPostcodeIndex:
+    """
+    Memory-mapped postcodes_fixed.idx (sorted 7-byte NUL-padded keys)
+    alongside postcodes_data.bin. Opening costs two mmap calls and reading
+    the small block table; the first key of every block is bisected in
+    place, then the block that can hold the postcode, so only the pages a
+    lookup touches are ever read in. Each block is checked against its
+    CRC32 the first time a lookup touches it.
+    """
+
+    FILENAME = "postcodes_fixed.idx"
+
+    def __init__(self, idx_path, data_path):
+        self.idx_map = map_file(idx_path)
+        self.data_map = map_file(data_path)
+
+        _, self.count, self.table_offset, table_checksum = read_block_header(
+            self.idx_map, FIXED_HEADER, FIXED_MAGIC, FIXED_VERSION, idx_path
+        )
+        table_size = len(self.idx_map) - self.table_offset
+        if self.table_offset != FIXED_HEADER.size + self.count * KEY_WIDTH or table_size % FIXED_BLOCK.size:
+            raise ValueError(f"{idx_path} is truncated")
+        if len(self.data_map) != self.count * 2:
+            raise ValueError(f"{data_path} does not match {idx_path}")
+        if zlib.crc32(self.idx_map[self.table_offset:]) != table_checksum:
+            raise ValueError(f"{idx_path} block table is corrupt (checksum mismatch)")
+
+        self.blocks = table_size // FIXED_BLOCK.size
+        self.verified = bytearray(self.blocks)
+        self.keys = FixedWidthKeys(self.idx_map, KEY_WIDTH, offset=FIXED_HEADER.size, count=self.count)
+        self.first_keys = FixedWidthKeys(
+            self.idx_map, KEY_WIDTH,
+            stride=FIXED_BLOCK.size,
+            offset=self.table_offset + 8,
+            count=self.blocks
+        )
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME) and find_packaged("postcodes_data.bin"))
+
+    @classmethod
+    def open(cls):
+        return cls(find_packaged(cls.FILENAME), find_packaged("postcodes_data.bin"))
+
+    def __len__(self):
+        return self.count
+
+    def checked_block(self, block):
+        """(first entry, end entry) of a block, checking its CRC32 on first use."""
+        start, crc, _ = FIXED_BLOCK.unpack_from(self.idx_map, self.table_offset + block * FIXED_BLOCK.size)
+        if block + 1 < self.blocks:
+            end = struct.unpack_from("<I", self.idx_map, self.table_offset + (block + 1) * FIXED_BLOCK.size)[0]
+        else:
+            end = self.count
+
+        if not self.verified[block]:
+            offset = FIXED_HEADER.size + start * KEY_WIDTH
+            end_offset = FIXED_HEADER.size + end * KEY_WIDTH
+            if block_checksum(self.idx_map, self.data_map, offset, end_offset, start, end) != crc:
+                raise ValueError(f"postcodes_fixed.idx block {block} is corrupt (checksum mismatch)")
+            self.verified[block] = 1
+        return start, end
+
+    def find(self, pcd):
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return None
+
+        block = bisect.bisect_right(self.first_keys, key) - 1
+        if block < 0:
+            return None
+
+        start, end = self.checked_block(block)
+        i = bisect.bisect_left(self.keys, key, start, end)
+        if i >= end or self.keys[i] != key:
+            return None
+        return self.data_map[i * 2], self.data_map[i * 2 + 1]
+
+    def iter_from(self, pcd):
+        """Postcodes in sorted order from the first one >= pcd, checking a block at a time."""
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return
+        for block in range(max(bisect.bisect_right(self.first_keys, key) - 1, 0), self.blocks):
+            start, end = self.checked_block(block)
+            for i in range(bisect.bisect_left(self.keys, key, start, end), end):
+                yield self.keys[i].rstrip(b"\0").decode("ascii")
+
+    def close(self):
+        self.idx_map.close()
+        self.data_map.close()
+
+def decode_entries(buf, pos, prev, count):
+    """Decode up to `count` prefix/suffix entries starting at byte `pos`."""
+    for _ in range(count):
+        prefix_len = buf[pos]
+        suffix_len = buf[pos + 1]
+        pos += 2
+
+        prev = prev[:prefix_len] + buf[pos:pos + suffix_len].decode("ascii")
+        pos += suffix_len
+        yield prev
+
+class RestartPostcodeIndex:
+    """
+    Memory-mapped postcodes.idx used through its restart table: the first
+    key of every block is bisected in place, then only the one block that
+    can hold the postcode is decoded. Each block is checked against its
+    CRC32 the first time a lookup touches it, so a damaged file is caught
+    without hashing all of it at startup.
+    """
+
+    FILENAME = "postcodes.idx"
+
+    def __init__(self, idx_path, data_path):
+        self.idx_map = map_file(idx_path)
+        self.data_map = map_file(data_path)
+
+        _, self.count, self.table_offset, _, table_checksum = read_compact_header(self.idx_map, idx_path)
+        self.blocks = (len(self.idx_map) - self.table_offset) // COMPACT_RESTART.size
+        if len(self.data_map) != self.count * 2:
+            raise ValueError(f"{data_path} does not match {idx_path}")
+        if zlib.crc32(self.idx_map[self.table_offset:]) != table_checksum:
+            raise ValueError(f"{idx_path} restart table is corrupt (checksum mismatch)")
+
+        self.verified = bytearray(self.blocks)
+        self.first_keys = FixedWidthKeys(
+            self.idx_map, KEY_WIDTH,
+            stride=COMPACT_RESTART.size,
+            offset=self.table_offset + 12,
+            count=self.blocks
+        )
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME) and find_packaged("postcodes_data.bin"))
+
+    @classmethod
+    def open(cls):
+        return cls(find_packaged(cls.FILENAME), find_packaged("postcodes_data.bin"))
+
+    def __len__(self):
+        return self.count
+
+    def restart_point(self, block):
+        """(byte offset, first entry number, CRC32) of a block."""
+        return struct.unpack_from("<III", self.idx_map, self.table_offset + block * COMPACT_RESTART.size)
+
+    def checked_block(self, block):
+        """(byte offset, first entry, end entry) of a block, checking its CRC32 on first use."""
+        pos, start, crc = self.restart_point(block)
+        if block + 1 < self.blocks:
+            end_pos, end, _ = self.restart_point(block + 1)
+        else:
+            end_pos, end = self.table_offset, self.count
+
+        if not self.verified[block]:
+            if block_checksum(self.idx_map, self.data_map, pos, end_pos, start, end) != crc:
+                raise ValueError(f"postcodes.idx block {block} is corrupt (checksum mismatch)")
+            self.verified[block] = 1
+        return pos, start, end
+
+    def find(self, pcd):
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return None
+
+        block = bisect.bisect_right(self.first_keys, key) - 1
+        if block < 0:
+            return None
+
+        pos, start, end = self.checked_block(block)
+        for i, postcode in enumerate(decode_entries(self.idx_map, pos, "", end - start)):
+            if postcode >= pcd:
+                if postcode != pcd:
+                    return None
+                i += start
+                return self.data_map[i * 2], self.data_map[i * 2 + 1]
+        return None
+
+    def iter_from(self, pcd):
+        """Postcodes in sorted order from the first one >= pcd, decoding a block at a time."""
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return
+        for block in range(max(bisect.bisect_right(self.first_keys, key) - 1, 0), self.blocks):
+            pos, start, end = self.checked_block(block)
+            for postcode in decode_entries(self.idx_map, pos, "", end - start):
+                if postcode >= pcd:
+                    yield postcode
+
+    def close(self):
+        self.idx_map.close()
+        self.data_map.close()
+
+class LRUCache:
+    """
+    Small thread-safe LRU map with hit/miss counters. Loads run outside
+    the lock, so a slow miss never holds up hits on other threads. Two
+    threads missing on the same key at once may both load it (loaders
+    only read immutable files, so that costs time, not correctness);
+    the first value inserted is the one kept.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        # Bumped by clear(), so a load started before it is not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader(key)
+
+        with self._lock:
+            if generation != self._generation:
+                return value
+            if key in self._items:
+                return self._items[key]
+            self._items[key] = value
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._generation += 1
+
+class ShardedPostcodeIndex:
+    """
+    One shard per postcode area under shards/, described by
+    shards/index.json. A shard is read, and checked against its CRC32,
+    the first time a postcode in its area is looked up; at most
+    max_shards stay resident.
+    """
+
+    FILENAME = "shards/index.json"
+
+    def __init__(self, directory, max_shards=8):
+        if directory.get("version") != SHARD_VERSION:
+            raise ValueError(f"Unsupported shard directory version {directory.get('version')}")
+        if directory.get("record_size") != SHARD_RECORD_SIZE:
+            raise ValueError("Shard record size does not match this reader")
+
+        self.shard_sizes = directory["shards"]
+        self.checksums = directory["checksums"]
+        self.cache = LRUCache(max_shards)
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME))
+
+    @classmethod
+    def open(cls):
+        return cls(load_json(cls.FILENAME))
+
+    def __len__(self):
+        return sum(self.shard_sizes.values())
+
+    def load_shard(self, area):
+        records = load_binary(f"shards/{area}.bin")
+        if len(records) != self.shard_sizes[area] * SHARD_RECORD_SIZE:
+            raise ValueError(f"Shard {area} does not match shards/index.json")
+        if zlib.crc32(records) != self.checksums.get(area):
+            raise ValueError(f"Shard {area} is corrupt (checksum mismatch)")
+        return records
+
+    def find(self, pcd):
+        key = encode_fixed_key(pcd)
+        area = postcode_area(pcd)
+        if key is None or area not in self.shard_sizes:
+            return None
+
+        records = self.cache.get_or_load(area, self.load_shard)
+        keys = FixedWidthKeys(records, KEY_WIDTH, stride=SHARD_RECORD_SIZE)
+
+        i = bisect.bisect_left(keys, key)
+        if i >= len(keys) or keys[i] != key:
+            return None
+        pos = i * SHARD_RECORD_SIZE + KEY_WIDTH
+        return records[pos], records[pos + 1]
+
+    def close(self):
+        self.cache.clear()
+
+class CompressedPostcodeIndex:
+    """
+    Memory-mapped postcodes.zidx: the first key of every compressed block
+    is bisected in place and only the block that can hold the postcode is
+    inflated. The most recently used max_blocks blocks stay decoded.
+    zlib's own checksum catches a damaged block when it is inflated.
+    """
+
+    FILENAME = "postcodes.zidx"
+
+    def __init__(self, path, max_blocks=64):
+        self.map = map_file(path)
+
+        if len(self.map) < ZIDX_HEADER.size:
+            raise ValueError(f"{path} is truncated")
+        magic, version, _, self.count, self.table_offset, table_checksum, _ = ZIDX_HEADER.unpack_from(self.map, 0)
+        if magic != ZIDX_MAGIC:
+            raise ValueError(f"{path} is not a compressed postcode index")
+        if version != ZIDX_VERSION:
+            raise ValueError(f"Unsupported postcodes.zidx version {version} in {path}")
+
+        table_size = len(self.map) - self.table_offset
+        if self.table_offset < ZIDX_HEADER.size or table_size < 0 or table_size % ZIDX_BLOCK.size:
+            raise ValueError(f"{path} is truncated")
+        if zlib.crc32(self.map[self.table_offset:]) != table_checksum:
+            raise ValueError(f"{path} block table is corrupt (checksum mismatch)")
+
+        self.blocks = table_size // ZIDX_BLOCK.size
+        self.first_keys = FixedWidthKeys(
+            self.map, KEY_WIDTH,
+            stride=ZIDX_BLOCK.size,
+            offset=self.table_offset + 8,
+            count=self.blocks
+        )
+        self.cache = LRUCache(max_blocks)
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME))
+
+    @classmethod
+    def open(cls):
+        return cls(find_packaged(cls.FILENAME))
+
+    def __len__(self):
+        return self.count
+
+    def block_range(self, block):
+        """(byte offset, end offset, first entry, end entry) of a block."""
+        offset, entry = struct.unpack_from("<II", self.map, self.table_offset + block * ZIDX_BLOCK.size)
+        if block + 1 < self.blocks:
+            end_offset, end_entry = struct.unpack_from("<II", self.map, self.table_offset + (block + 1) * ZIDX_BLOCK.size)
+        else:
+            end_offset, end_entry = self.table_offset, self.count
+        return offset, end_offset, entry, end_entry
+
+    def load_block(self, block):
+        """Inflate one block into (its keys, its BRMA/country id pairs)."""
+        offset, end_offset, entry, end_entry = self.block_range(block)
+        n = end_entry - entry
+        try:
+            raw = zlib.decompress(self.map[offset:end_offset])
+        except zlib.error as e:
+            raise ValueError(f"postcodes.zidx block {block} is corrupt ({e})") from None
+        if len(raw) != n * (KEY_WIDTH + 2):
+            raise ValueError(f"postcodes.zidx block {block} is truncated")
+        return FixedWidthKeys(raw, KEY_WIDTH, count=n), raw[n * KEY_WIDTH:]
+
+    def find(self, pcd):
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return None
+
+        block = bisect.bisect_right(self.first_keys, key) - 1
+        if block < 0:
+            return None
+
+        keys, data = self.cache.get_or_load(block, self.load_block)
+        i = bisect.bisect_left(keys, key)
+        if i >= len(keys) or keys[i] != key:
+            return None
+        return data[i * 2], data[i * 2 + 1]
+
+    def iter_from(self, pcd):
+        """Postcodes in sorted order from the first one >= pcd, inflating a block at a time."""
+        key = encode_fixed_key(pcd)
+        if key is None:
+            return
+        for block in range(max(bisect.bisect_right(self.first_keys, key) - 1, 0), self.blocks):
+            keys, _ = self.cache.get_or_load(block, self.load_block)
+            for i in range(bisect.bisect_left(keys, key), len(keys)):
+                yield keys[i].rstrip(b"\0").decode("ascii")
+
+    def close(self):
+        self.cache.clear()
+        self.map.close()
+
+class PerfectHashIndex:
+    """
+    Memory-mapped postcodes_phf.bin: a minimal perfect hash from postcode
+    to slot, with a 32-bit fingerprint and the BRMA/country payload in
+    each slot. O(1) per lookup; it cannot enumerate postcodes in order.
+    The block of displacements and the block of slots a lookup reads are
+    each checked against their CRC32 the first time they are touched.
+    """
+
+    FILENAME = "postcodes_phf.bin"
+
+    def __init__(self, path):
+        self.map = map_file(path)
+
+        block, slots, buckets, seed, table_checksum = read_block_header(
+            self.map, PHF_HEADER, PHF_MAGIC, PHF_VERSION, path
+        )
+
+        self.block = block
+        self.slots = slots
+        self.buckets = buckets
+        self.seed = seed
+        self.bucket_blocks = -(-buckets // block) if block else 0
+        self.slot_blocks = -(-slots // block) if block else 0
+        self.disp_offset = PHF_HEADER.size + (self.bucket_blocks + self.slot_blocks) * 4
+        self.fp_offset = self.disp_offset + buckets * 8
+        self.payload_offset = self.fp_offset + slots * 4
+
+        if not block or self.payload_offset + slots * 2 != len(self.map):
+            raise ValueError(f"{path} is truncated")
+        if zlib.crc32(self.map[PHF_HEADER.size:self.disp_offset]) != table_checksum:
+            raise ValueError(f"{path} block table is corrupt (checksum mismatch)")
+
+        self.bucket_verified = bytearray(self.bucket_blocks)
+        self.slot_verified = bytearray(self.slot_blocks)
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME))
+
+    @classmethod
+    def open(cls):
+        return cls(find_packaged(cls.FILENAME))
+
+    def __len__(self):
+        return self.slots
+
+    def find(self, pcd):
+        if not self.slots:
+            return None
+        try:
+            h0, h1, h2, fingerprint = phf_hash(pcd, self.seed)
+        except UnicodeEncodeError:
+            return None
+
+        bucket = h0 % self.buckets
+        if not self.bucket_verified[bucket // self.block]:
+            self.check_bucket_block(bucket // self.block)
+        d0, d1 = struct.unpack_from("<II", self.map, self.disp_offset + bucket * 8)
+        slot = phf_slot(h1, h2, d0, d1, self.slots)
+
+        if not self.slot_verified[slot // self.block]:
+            self.check_slot_block(slot // self.block)
+        if struct.unpack_from("<I", self.map, self.fp_offset + slot * 4)[0] != fingerprint:
+            return None
+        pos = self.payload_offset + slot * 2
+        return self.map[pos], self.map[pos + 1]
+
+    def block_crc(self, n):
+        return struct.unpack_from("<I", self.map, PHF_HEADER.size + n * 4)[0]
+
+    def check_bucket_block(self, block):
+        start = self.disp_offset + block * self.block * 8
+        end = min(start + self.block * 8, self.fp_offset)
+        if zlib.crc32(self.map[start:end]) != self.block_crc(block):
+            raise ValueError(f"postcodes_phf.bin displacement block {block} is corrupt (checksum mismatch)")
+        self.bucket_verified[block] = 1
+
+    def check_slot_block(self, block):
+        start = block * self.block
+        end = min(start + self.block, self.slots)
+        crc = zlib.crc32(self.map[self.fp_offset + start * 4:self.fp_offset + end * 4])
+        crc = zlib.crc32(self.map[self.payload_offset + start * 2:self.payload_offset + end * 2], crc)
+        if crc != self.block_crc(self.bucket_blocks + block):
+            raise ValueError(f"postcodes_phf.bin slot block {block} is corrupt (checksum mismatch)")
+        self.slot_verified[block] = 1
+
+    def close(self):
+        self.map.close()
+
+class PackedKeyIndex:
+    """
+    postcodes_keys.bin (sorted uint64 keys) read into a single array('Q')
+    in one bulk read: about 8 bytes per postcode instead of a Python str
+    each. Lookups bisect the array; postcodes_data.bin holds the payload.
+    The keys are checked against their CRC32 as they are read, and each
+    block of postcodes_data.bin the first time a lookup touches it.
+    """
+
+    FILENAME = "postcodes_keys.bin"
+
+    def __init__(self, keys_path, data_path):
+        with open(keys_path, "rb") as f:
+            buf = f.read()
+        self.block, count, keys_checksum, table_checksum = read_block_header(
+            buf, PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION, keys_path
+        )
+        table_offset = PACKED_HEADER.size + count * 8
+        blocks = -(-count // self.block) if self.block else 0
+        if not self.block or len(buf) != table_offset + blocks * 4:
+            raise ValueError(f"{keys_path} is truncated")
+
+        keys = memoryview(buf)[PACKED_HEADER.size:table_offset]
+        if zlib.crc32(keys) != keys_checksum:
+            raise ValueError(f"{keys_path} is corrupt (checksum mismatch)")
+        if zlib.crc32(buf[table_offset:]) != table_checksum:
+            raise ValueError(f"{keys_path} block table is corrupt (checksum mismatch)")
+
+        self.keys = array("Q")
+        self.keys.frombytes(keys)
+        self.checksums = array("I")
+        self.checksums.frombytes(buf[table_offset:])
+        if sys.byteorder == "big":
+            self.keys.byteswap()
+            self.checksums.byteswap()
+        self.verified = bytearray(blocks)
+
+        self.data_map = map_file(data_path)
+        if len(self.data_map) != count * 2:
+            raise ValueError(f"{data_path} does not match {keys_path}")
+
+    @classmethod
+    def available(cls):
+        return bool(find_packaged(cls.FILENAME) and find_packaged("postcodes_data.bin"))
+
+    @classmethod
+    def open(cls):
+        return cls(find_packaged(cls.FILENAME), find_packaged("postcodes_data.bin"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, pcd):
+        key = pack_postcode(pcd)
+        if key is None:
+            return None
+
+        i = bisect.bisect_left(self.keys, key)
+        if i >= len(self.keys) or self.keys[i] != key:
+            return None
+        return self.record(i)
+
+    def record(self, i):
+        """(BRMA id, country id) of entry i, checking its data block on first use."""
+        block = i // self.block
+        if not self.verified[block]:
+            start = block * self.block * 2
+            if zlib.crc32(self.data_map[start:start + self.block * 2]) != self.checksums[block]:
+                raise ValueError(f"postcodes_data.bin block {block} is corrupt (checksum mismatch)")
+            self.verified[block] = 1
+        return self.data_map[i * 2], self.data_map[i * 2 + 1]
+
+    def find_many(self, pcds):
+        """find() for a batch, with one vectorised search when numpy is available."""
+        packed = [pack_postcode(p) for p in pcds]
+        keys = self.keys
+        n = len(keys)
+
+        if numpy is not None and n:
+            query = numpy.fromiter((k or 0 for k in packed), dtype=numpy.uint64, count=len(packed))
+            positions = numpy.searchsorted(numpy.frombuffer(keys, dtype=numpy.uint64), query).tolist()
+        else:
+            positions = [bisect.bisect_left(keys, k) if k is not None else n for k in packed]
+
+        results = []
+        for k, i in zip(packed, positions):
+            if k is None or i >= n or keys[i] != k:
+                results.append(None)
+            else:
+                results.append(self.record(i))
+        return results
+
+    def close(self):
+        self.data_map.close()
+
+# Random-access formats, most preferred first. "compact" (full decode of
+# postcodes.idx into all_postcodes) is always the last resort.
+INDEX_FORMATS = {
+    "phf": PerfectHashIndex,
+    "packed": PackedKeyIndex,
+    "fixed": MappedPostcodeIndex,
+    "zidx": CompressedPostcodeIndex,
+    "restart": RestartPostcodeIndex,
+    "shards": ShardedPostcodeIndex,
+}
+
+def available_index_format():
+    for name, cls in INDEX_FORMATS.items():
+        if cls.available():
+            return name
+    return "compact"
+
+def compact_available():
+    """True if the files the "compact" format decodes are packaged."""
+    return bool(find_packaged("postcodes.idx") and find_packaged("postcodes_data.bin"))
+
+def open_postcode_index(index_format):
+    return INDEX_FORMATS[index_format].open()
+
+def estimated_memory(index_format):
+    """
+    Rough bytes of RAM index_format holds once loaded, worked out from
+    the packaged file sizes without opening it. Pages the OS maps in
+    from a file on demand are not counted.
+    """
+    def size(name):
+        path = find_packaged(name)
+        return os.path.getsize(path) if path else 0
+
+    if index_format == "compact":
+        # Both files are read in, plus a str and a list slot per postcode
+        return size("postcodes.idx") + size("postcodes_data.bin") + size("postcodes_data.bin") // 2 * 64
+    if index_format == "packed":
+        return size(PackedKeyIndex.FILENAME)
+    if index_format == "shards":
+        if not ShardedPostcodeIndex.available():
+            return 0
+        shard_sizes = sorted(load_json(ShardedPostcodeIndex.FILENAME)["shards"].values(), reverse=True)
+        # Up to 8 shards (the default max_shards) stay resident
+        return sum(shard_sizes[:8]) * SHARD_RECORD_SIZE
+    if index_format == "zidx":
+        # Up to 64 inflated blocks of about 256 records
+        return 64 * 256 * (KEY_WIDTH + 2)
+    return 0
+
 # ============================================================
 # Public loader (called from DisclaimerScreen thread)
 # ============================================================
 
-def load_all_postcode_data(progress=None, status=None):
+def read_string_table(buf):
     """
-    Loads all postcode data with optional progress + status callbacks.
-    Designed to run in a background thread.
+    Parse brma_table.bin into (BRMA codes, BRMA names, country codes),
+    each a list indexed by the ids stored in postcodes_data.bin.
     """
+    magic, version, brma_count, country_count = STRING_TABLE_HEADER.unpack_from(buf, 0)
+    if magic != STRING_TABLE_MAGIC:
+        raise ValueError("brma_table.bin is not a BRMA string table")
+    if version != STRING_TABLE_VERSION:
+        raise ValueError(f"Unsupported BRMA string table version {version}")
+
+    pos = STRING_TABLE_HEADER.size
+
+    def read(length_size):
+        nonlocal pos
+        length = int.from_bytes(buf[pos:pos + length_size], "little")
+        pos += length_size
+        text = buf[pos:pos + length].decode("utf-8")
+        pos += length
+        return text
+
+    codes = []
+    names = []
+    for _ in range(brma_count):
+        codes.append(read(1))
+        names.append(read(2))
+    countries = [read(1) for _ in range(country_count)]
 
-    global idx_bytes, data_bytes, all_postcodes
+    if pos != len(buf):
+        raise ValueError("brma_table.bin has trailing or missing bytes")
+    return codes, names, countries
+
+def invert_ids(id_map):
+    """{code: id} -> list of codes indexed by id."""
+    rev = [None] * len(id_map)
+    for code, i in id_map.items():
+        rev[i] = code
+    return rev
+
+def load_dictionaries():
     global brma_dict, country_dict, brma_names
-    global brma_rev, country_rev
+    global brma_rev, brma_name_rev, country_rev
+
+    # Preferred: one binary string table, already in id order
+    if find_packaged("brma_table.bin"):
+        brma_rev, brma_name_rev, country_rev = read_string_table(load_binary("brma_table.bin"))
+        return
+
+    brma_dict = load_json("brma_dict.json")
+    country_dict = load_json("country_dict.json")
+    brma_names = load_json("brma_names.json")
+
+    # Reverse lookup lists
+    brma_rev = invert_ids(brma_dict)
+    brma_name_rev = [brma_names.get(code, code) for code in brma_rev]
+    country_rev = invert_ids(country_dict)
+
+def brma_name_map():
+    """BRMA code -> BRMA name, for backends that only store codes."""
+    if brma_rev is None:
+        load_dictionaries()
+    return dict(zip(brma_rev, brma_name_rev))
+
+# ============================================================
+# Snapshot cache of the reconstructed postcode list
+# ============================================================
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NAME = "postcodes_snapshot.marshal"
+
+def snapshot_key(idx_bytes, data_bytes):
+    """
+    Identifies the packaged data a snapshot was made from, plus the
+    snapshot layout and marshal format it was written with.
+    """
+    h = hashlib.sha1()
+    h.update(f"{SNAPSHOT_VERSION}:{marshal.version}:{sys.version_info[:2]}".encode("ascii"))
+    h.update(idx_bytes)
+    h.update(data_bytes)
+    return h.hexdigest()
+
+def load_snapshot(cache_dir, key):
+    """Return the cached postcode list for `key`, or None if missing or stale."""
+    path = os.path.join(cache_dir, SNAPSHOT_NAME)
+    try:
+        # One bulk read: marshal.load on the file object reads it piecemeal
+        with open(path, "rb") as f:
+            snapshot_key_, postcodes = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        if os.path.exists(path):
+            print("Ignoring unreadable postcode snapshot:", e)
+        return None
+
+    if snapshot_key_ != key:
+        return None
+    return postcodes
+
+def save_snapshot(cache_dir, key, postcodes):
+    path = os.path.join(cache_dir, SNAPSHOT_NAME)
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            marshal.dump((key, postcodes), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # A missing snapshot only costs the next launch a full decode
+        print("Could not write postcode snapshot:", e)
 
-    # 1) Load index
+# ============================================================
+# Delta overlay (postcodes_delta.json)
+# ============================================================
+
+def read_packaged_header(name, size):
+    """The first `size` bytes of a packaged file."""
+    path = find_packaged(name)
+    if not path:
+        raise FileNotFoundError(f"Missing packaged file: {name}")
+    with open(path, "rb") as f:
+        return f.read(size)
+
+def index_filename(index_format):
+    """The packaged file index_format reads its postcodes from."""
+    if index_format == "compact":
+        return "postcodes.idx"
+    return INDEX_FORMATS[index_format].FILENAME
+
+def packaged_fingerprint(name):
+    """dataset_fingerprint of a packaged file, or None if it is missing or cannot be fingerprinted."""
+    if not find_packaged(name):
+        return None
+    if name == ShardedPostcodeIndex.FILENAME:
+        return shard_fingerprint(load_json(name))
+    if name not in FINGERPRINTED_HEADERS:
+        return None
+    return dataset_fingerprint(name, read_packaged_header(name, FINGERPRINTED_HEADERS[name][0].size))
+
+def load_delta_overlay(index_format):
+    """
+    Load postcodes_delta.json, if packaged, as a dict overlay consulted
+    before the index. The base index is never decoded or rewritten.
+    The delta applies only if it records a fingerprint for the file
+    index_format reads and that file matches it; a delta built against
+    other data, or one that cannot be checked, is ignored.
+    """
+    global overlay
+
+    if not find_packaged("postcodes_delta.json"):
+        overlay = None
+        return
+
+    delta = load_json("postcodes_delta.json")
+    if delta.get("version") != DELTA_VERSION:
+        print("Ignoring postcode delta with unsupported version", delta.get("version"))
+        overlay = None
+        return
+
+    name = index_filename(index_format)
+    fingerprint = packaged_fingerprint(name)
+    if fingerprint is None or delta.get("base", {}).get(name) != fingerprint:
+        print(f"Ignoring postcode delta not built for this {name}")
+        overlay = None
+        return
+
+    names = dict(zip(brma_rev, brma_name_rev))
+    names.update(delta.get("brma_names", {}))
+
+    patch = {}
+    for pcd, (brma_code, country_code) in delta.get("upserts", {}).items():
+        patch[pcd] = (brma_code, names.get(brma_code, brma_code), country_code)
+    for pcd in delta.get("removed", []):
+        patch[pcd] = None
+
+    overlay = patch
+
+def overlay_result(pcd):
+    entry = overlay[pcd]
+    if entry is None:
+        return None
+    return {
+        "postcode": pcd,
+        "brma_code": entry[0],
+        "brma_name": entry[1],
+        "country": entry[2]
+    }
+
+def build_postcode_index(index_format=None, progress=None, status=None, cache_dir=None):
+    """
+    Open or build the index for index_format and return it, without
+    publishing it as the module's active index: a PostcodeLoader keeps
+    what it builds to itself, so two loaders never share (or pin) each
+    other's data. The dictionaries and delta overlay, which are the same
+    for every format, are loaded into the module as before.
+
+    index_format picks an entry from INDEX_FORMATS or "compact"; by
+    default the first packaged random-access format is used, which makes
+    lookups available without decoding postcodes.idx at all.
+    cache_dir, if given, holds a snapshot of the reconstructed list so
+    later launches of the "compact" format skip the decode loop.
+    """
+    if index_format is None:
+        index_format = available_index_format()
+
+    # 1) Load dictionaries (before returning the index, so a lookup never
+    #    sees an index without the maps it needs)
+    if status: status("Loading BRMA dictionaries…")
+    load_dictionaries()
+    load_delta_overlay(index_format)
+    if progress: progress(0.10)
+
+    if index_format != "compact":
+        # 2) Open random-access index (no decode step)
+        if status: status("Opening postcode index…")
+        idx = open_postcode_index(index_format)
+
+        if progress: progress(1.0)
+        if status: status("Postcode data ready")
+        return idx
+
+    # 2) Load index
     if status: status("Loading postcode index…")
     idx_bytes = load_binary("postcodes.idx")
-    if progress: progress(0.10)
+    if progress: progress(0.15)
 
-    # 2) Load data
+    # 3) Load data
     if status: status("Loading postcode data…")
-    data_bytes = load_binary("postcodes_data.bin")
+    data = load_binary("postcodes_data.bin")
     if progress: progress(0.20)
 
-    # 3) Reconstruct postcodes (heavy step)
-    if status: status("Reconstructing postcodes…")
-    all_postcodes = reconstruct_all_postcodes(
-        idx_bytes,
-        progress_callback=lambda v: progress(0.20 + v * 0.60) if progress else None
-    )
+    # 4) Reuse the snapshot from a previous launch if the data is unchanged
+    postcodes = None
+    if cache_dir:
+        key = snapshot_key(idx_bytes, data)
+        postcodes = load_snapshot(cache_dir, key)
 
-    # 4) Load dictionaries
-    if status: status("Loading BRMA dictionaries…")
-    brma_dict = load_json("brma_dict.json")
-    country_dict = load_json("country_dict.json")
-    brma_names = load_json("brma_names.json")
-
-    # Reverse lookup maps
-    brma_rev = {v: k for k, v in brma_dict.items()}
-    country_rev = {v: k for k, v in country_dict.items()}
+    # 5) Otherwise reconstruct postcodes (heavy step) and snapshot them.
+    #    Every block is about to be read anyway, so check them all first
+    if postcodes is None:
+        if status: status("Reconstructing postcodes…")
+        verify_compact_blocks(idx_bytes, data)
+        postcodes = reconstruct_all_postcodes(
+            idx_bytes,
+            progress_callback=lambda v: progress(0.20 + v * 0.80) if progress else None
+        )
+        if cache_dir:
+            save_snapshot(cache_dir, key, postcodes)
 
     if progress: progress(1.0)
     if status: status("Postcode data ready")
+    return SortedListIndex(postcodes, data)
+
+def load_all_postcode_data(progress=None, status=None, index_format=None, cache_dir=None):
+    """
+    Loads all postcode data with optional progress + status callbacks
+    and makes it the index behind lookup_postcode and the other
+    module-level functions. Designed to run in a background thread.
+    Arguments as for build_postcode_index.
+    """
+
+    global data_bytes, all_postcodes, index
+
+    idx = build_postcode_index(index_format, progress, status, cache_dir)
+    if isinstance(idx, SortedListIndex):
+        all_postcodes, data_bytes = idx.postcodes, idx.data
+    else:
+        all_postcodes, data_bytes = None, None
+    index = idx
+
+def is_loaded():
+    return index is not None
+
+# ============================================================
+# Background loader with partial answers
+# ============================================================
+
+class PostcodeLoader:
+    """
+    Runs build_postcode_index on a background thread so startup never
+    waits for postcode data, and keeps the index it builds: it is not
+    shared with the module-level functions or other loaders, and close()
+    lets it go. While the "compact" format is being decoded, lookup()
+    answers from the restart table of postcodes.idx instead of raising
+    RuntimeError. For the random-access formats opening is the whole
+    load, so a lookup made before it finishes waits for it rather than
+    opening the files a second time.
+
+    A load that raises leaves the loader FAILED, with the exception in
+    error. "compact" lookups keep answering from the restart table;
+    the other formats raise RuntimeError.
+    """
+
+    NOT_STARTED = "not started"
+    PARTIAL = "partial"
+    READY = "ready"
+    FAILED = "failed"
+    CLOSED = "closed"
+
+    def __init__(self, index_format=None, cache_dir=None):
+        self.index_format = index_format
+        self.cache_dir = cache_dir
+        self.state = self.NOT_STARTED
+        self.error = None
+        self._index = None
+        self._partial = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, progress=None, status=None):
+        with self._lock:
+            if self._thread is not None or self.state == self.CLOSED:
+                return
+            if self.index_format is None:
+                self.index_format = available_index_format()
+            self.state = self.PARTIAL
+            self._thread = threading.Thread(target=self._run, args=(progress, status), daemon=True)
+            self._thread.start()
+
+    def _run(self, progress, status):
+        try:
+            idx = build_postcode_index(
+                index_format=self.index_format,
+                progress=progress,
+                status=status,
+                cache_dir=self.cache_dir
+            )
+        except Exception as e:
+            print("Postcode load error:", e)
+            with self._lock:
+                self.error = e
+                if self.state != self.CLOSED:
+                    self.state = self.FAILED
+            return
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            self._index = idx
+            self.state = self.READY
+            # Dropped rather than closed: a lookup may still be using it
+            self._partial = None
+
+    def partial_index(self):
+        """The restart table of postcodes.idx, answering while "compact" decodes."""
+        with self._lock:
+            if self._partial is None:
+                if brma_rev is None:
+                    load_dictionaries()
+                    load_delta_overlay(self.index_format)
+                self._partial = RestartPostcodeIndex.open()
+            return self._partial
+
+    def current_index(self):
+        """
+        The loaded index once ready. Until then, the partial one for
+        "compact", or the random-access format once its load thread has
+        opened it. Either way the dictionaries and overlay are loaded by
+        the time it returns, so callers go through here before
+        consulting them.
+        """
+        idx = self._index
+        if idx is not None:
+            return idx
+        if self.state == self.NOT_STARTED:
+            self.start()
+        if self.index_format == "compact":
+            return self.partial_index()
+
+        self.wait()
+        idx = self._index
+        if idx is None:
+            if self.state == self.CLOSED:
+                raise RuntimeError("Postcode loader is closed")
+            raise RuntimeError(f"Postcode data failed to load: {self.error}")
+        return idx
+
+    def complete(self, prefix, limit=10):
+        return complete_from(self.current_index(), prefix, limit)
+
+    def suggest(self, pcd, limit=10):
+        return suggest_from(self.current_index(), pcd, limit)
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.state == self.READY
+
+    def lookup(self, pcd):
+        return lookup_from(self.current_index(), pcd)
+
+    def lookup_many(self, pcds):
+        return lookup_many_from(self.current_index(), pcds)
+
+    def close(self):
+        """
+        Let go of the loaded index so its memory can be freed. A load
+        still running is discarded when it finishes. Indexes are dropped
+        rather than closed, as a lookup on another thread may still be
+        using them. One arriving after close() is answered from the
+        partial index for "compact", without starting another load, and
+        raises RuntimeError for the other formats.
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self._index = None
 
 # ============================================================
 # Public lookup function
 # ============================================================
 
 def lookup_postcode(pcd):
-    if all_postcodes is None:
+    if index is None:
         raise RuntimeError("Postcode data not loaded. Call load_all_postcode_data() first.")
+    return lookup_from(index, pcd)
 
+def lookup_from(idx, pcd):
     pcd = normalise_postcode(pcd)
 
-    idx = bisect.bisect_left(all_postcodes, pcd)
-    if idx >= len(all_postcodes) or all_postcodes[idx] != pcd:
+    if overlay is not None and pcd in overlay:
+        return overlay_result(pcd)
+
+    ids = idx.find(pcd)
+    if ids is None:
         return None
+    return make_result(pcd, *ids)
+
+def make_result(pcd, b_id, c_id):
+    return {
+        "postcode": pcd,
+        "brma_code": brma_rev[b_id],
+        "brma_name": brma_name_rev[b_id],
+        "country": country_rev[c_id]
+    }
 
-    b_id = data_bytes[idx * 2]
-    c_id = data_bytes[idx * 2 + 1]
+# ============================================================
+# Bulk lookups
+# ============================================================
+
+def lookup_postcodes(pcds):
+    """
+    Look up many postcodes at once. Returns columnar results: a dict of
+    equal-length lists ("postcode", "brma_code", "brma_name", "country"),
+    with None in every column but "postcode" for postcodes not found.
+
+    Only the "packed" format has a batch search (find_many, one
+    numpy.searchsorted when numpy is installed). Every other format,
+    including "phf", which available_index_format prefers for single
+    lookups, answers a batch with one find() per postcode; load with
+    index_format="packed" when bulk throughput matters.
+    """
+    if index is None:
+        raise RuntimeError("Postcode data not loaded. Call load_all_postcode_data() first.")
+    return lookup_many_from(index, pcds)
+
+def lookup_many_from(idx, pcds):
+    pcds = [normalise_postcode(p) for p in pcds]
+
+    find_many = getattr(idx, "find_many", None)
+    if find_many is not None:
+        found = find_many(pcds)
+    else:
+        find = idx.find
+        found = [find(p) for p in pcds]
 
-    brma_code = brma_rev[b_id]
-    country_code = country_rev[c_id]
+    brma_codes = []
+    brma_labels = []
+    countries = []
+    for pcd, ids in zip(pcds, found):
+        if overlay is not None and pcd in overlay:
+            entry = overlay[pcd] or (None, None, None)
+            brma_codes.append(entry[0])
+            brma_labels.append(entry[1])
+            countries.append(entry[2])
+            continue
+
+        if ids is None:
+            brma_codes.append(None)
+            brma_labels.append(None)
+            countries.append(None)
+            continue
+
+        brma_codes.append(brma_rev[ids[0]])
+        brma_labels.append(brma_name_rev[ids[0]])
+        countries.append(country_rev[ids[1]])
 
     return {
-        "postcode": pcd,
-        "brma_code": brma_code,
-        "brma_name": brma_names.get(brma_code, brma_code),
-        "country": country_code
+        "postcode": pcds,
+        "brma_code": brma_codes,
+        "brma_name": brma_labels,
+        "country": countries
     }
+
+def iter_lookup_postcodes(pcds, batch_size=10000):
+    """
+    Streaming form of lookup_postcodes for arbitrarily large inputs (for
+    example the lines of an open file): consumes `pcds` lazily and yields
+    one columnar result per batch of up to batch_size postcodes.
+    """
+    pcds = iter(pcds)
+    while True:
+        batch = list(islice(pcds, batch_size))
+        if not batch:
+            return
+        yield lookup_postcodes(batch)
+
+# ============================================================
+# Prefix completion and typo suggestions
+# ============================================================
+
+# postcodes.idx opened through its restart table, for completing against
+# an index that has no sorted order to walk (phf, packed, shards)
+ordered_fallback = None
+ordered_fallback_lock = threading.Lock()
+
+def ordered_index(idx):
+    global ordered_fallback
+    if hasattr(idx, "iter_from"):
+        return idx
+    with ordered_fallback_lock:
+        if ordered_fallback is None:
+            ordered_fallback = RestartPostcodeIndex.open()
+        return ordered_fallback
+
+def in_index(idx, pcd):
+    if overlay is not None and pcd in overlay:
+        return overlay[pcd] is not None
+    return idx.find(pcd) is not None
+
+def complete_from(idx, prefix, limit=10):
+    """
+    The first `limit` postcodes starting with `prefix`, in sorted order,
+    with the delta overlay applied. Only the index blocks at the prefix
+    are read, so this is cheap enough to run on every keystroke.
+    """
+    prefix = normalise_postcode(prefix)
+    if not prefix:
+        return []
+
+    found = []
+    for pcd in ordered_index(idx).iter_from(prefix):
+        if len(found) >= limit or not pcd.startswith(prefix):
+            break
+        if found and found[-1] == pcd:
+            continue
+        if overlay is not None and pcd in overlay and overlay[pcd] is None:
+            continue
+        found.append(pcd)
+
+    if overlay is not None:
+        added = [pcd for pcd, entry in overlay.items() if entry is not None and pcd.startswith(prefix)]
+        found = sorted(set(found).union(added))[:limit]
+    return found
+
+def edits1(pcd):
+    """Every string one deleted, substituted, inserted or swapped character away from pcd."""
+    edits = set()
+    for i in range(len(pcd) + 1):
+        head, tail = pcd[:i], pcd[i:]
+        if tail:
+            edits.add(head + tail[1:])
+            edits.update(head + c + tail[1:] for c in PACK_ALPHABET)
+        if len(tail) > 1:
+            edits.add(head + tail[1] + tail[0] + tail[2:])
+        edits.update(head + c + tail for c in PACK_ALPHABET)
+    edits.discard(pcd)
+    return edits
+
+def suggest_from(idx, pcd, limit=10):
+    """
+    Known postcodes within edit distance 1 of pcd, in sorted order: the
+    usual single-key typo. Each of the few hundred candidates is one
+    exact find.
+    """
+    pcd = normalise_postcode(pcd)
+    if not pcd or len(pcd) > KEY_WIDTH + 1:
+        return []
+
+    found = []
+    for candidate in sorted(edits1(pcd)):
+        if len(candidate) <= KEY_WIDTH and in_index(idx, candidate):
+            found.append(candidate)
+            if len(found) >= limit:
+                break
+    return found
+
+def complete_postcode(prefix, limit=10):
+    if index is None:
+        raise RuntimeError("Postcode data not loaded. Call load_all_postcode_data() first.")
+    return complete_from(index, prefix, limit)
+
+def suggest_postcodes(pcd, limit=10):
+    if index is None:
+        raise RuntimeError("Postcode data not loaded. Call load_all_postcode_data() first.")
+    return suggest_from(index, pcd, limit)
@@ -0,0 +1,81 @@
+import csv
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS_DIR = os.path.join(REPO_DIR, "data", "tools")
+sys.path[:0] = [REPO_DIR, TOOLS_DIR]
+
+import build_postcode_files
+import generate_synthetic_postcodes
+
+SYNTHETIC_ROWS = 3000
+
+# Appended to the synthetic CSV: a postcode listed twice with different
+# BRMAs (lookups must return the first) and one with no space
+EXTRA_ROWS = [
+    ["E", "ZZ1 1AA", "9001", "Duplicate BRMA first"],
+    ["E", "ZZ1 1AA", "9002", "Duplicate BRMA second"],
+    ["S", "ZZ99ZZ", "9003", "No space BRMA"],
+]
+
+def write_csv(path, rows=SYNTHETIC_ROWS, seed=1, extra=EXTRA_ROWS):
+    generate_synthetic_postcodes.generate(path, rows, seed=seed)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(extra)
+
+def expected_lookups(csv_path):
+    """postcode -> (brma, country) for the first row of each postcode."""
+    expected = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            pcd = build_postcode_files.normalise_postcode(row["PCD"])
+            expected.setdefault(pcd, (row["brma"], row["country"]))
+    return expected
+
+def build(csv_path, out_dir, streaming=False):
+    """Run build_postcode_files against csv_path, writing into out_dir."""
+    saved = build_postcode_files.CSV_PATH, build_postcode_files.OUT_DIR
+    build_postcode_files.CSV_PATH = csv_path
+    build_postcode_files.OUT_DIR = out_dir
+    try:
+        if streaming:
+            build_postcode_files.build_streaming(chunk_size=500, workers=1)
+        else:
+            build_postcode_files.build_in_memory(workers=1)
+    finally:
+        build_postcode_files.CSV_PATH, build_postcode_files.OUT_DIR = saved
+
+@pytest.fixture(scope="session")
+def synthetic_csv(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("csv") / "postcodes.csv")
+    write_csv(path)
+    return path
+
+@pytest.fixture(scope="session")
+def built_dir(synthetic_csv, tmp_path_factory):
+    """Every postcode file format, built once from the synthetic CSV."""
+    out_dir = str(tmp_path_factory.mktemp("built"))
+    build(synthetic_csv, out_dir)
+    return out_dir
+
+@pytest.fixture(scope="session")
+def expected(synthetic_csv):
+    return expected_lookups(synthetic_csv)
+
+@pytest.fixture
+def postcode_dir(built_dir, tmp_path):
+    """A private copy of the built files, safe to corrupt or add a delta to."""
+    path = str(tmp_path / "postcodes")
+    shutil.copytree(built_dir, path)
+    return path
+
+def flip_byte(path, pos):
+    with open(path, "r+b") as f:
+        f.seek(pos)
+        b = f.read(1)
+        f.seek(pos)
+        f.write(bytes([b[0] ^ 0x5A]))
@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+import build_postcode_delta
+import build_postcode_files
+from conftest import build, flip_byte, write_csv
+from postcode_formats import (
+    block_checksum, compact_blocks, dataset_fingerprint, read_compact_header, phf_hash, phf_slot,
+    shard_fingerprint, FINGERPRINTED_HEADERS,
+)
+
+# Written identically by the in-memory and streaming builds
+STREAMED_FILES = [
+    "postcodes.idx", "postcodes_data.bin", "postcodes_fixed.idx", "postcodes_keys.bin",
+    "postcodes.zidx", "brma_table.bin",
+]
+
+def read(directory, name):
+    with open(os.path.join(directory, name), "rb") as f:
+        return f.read()
+
+def test_every_format_is_built_with_a_fingerprint(built_dir):
+    for name, (layout, _, _) in FINGERPRINTED_HEADERS.items():
+        assert dataset_fingerprint(name, read(built_dir, name)[:layout.size]) is not None, name
+
+    with open(os.path.join(built_dir, "shards", "index.json"), encoding="utf-8") as f:
+        assert shard_fingerprint(json.load(f)) is not None
+
+def test_compact_block_checksums_catch_a_flipped_data_byte(built_dir, postcode_dir):
+    idx = read(built_dir, "postcodes.idx")
+    _, count, table_offset, _, _ = read_compact_header(idx)
+
+    def bad_blocks(data):
+        return [
+            block for block, *bounds, crc in compact_blocks(idx, count, table_offset)
+            if block_checksum(idx, data, *bounds) != crc
+        ]
+
+    assert bad_blocks(read(built_dir, "postcodes_data.bin")) == []
+
+    data_path = os.path.join(postcode_dir, "postcodes_data.bin")
+    flip_byte(data_path, os.path.getsize(data_path) // 2)
+    assert len(bad_blocks(read(postcode_dir, "postcodes_data.bin"))) == 1
+
+def test_streaming_build_matches_in_memory_build(synthetic_csv, built_dir, tmp_path):
+    build(synthetic_csv, str(tmp_path), streaming=True)
+    for name in STREAMED_FILES:
+        assert read(str(tmp_path), name) == read(built_dir, name), name
+
+def test_streaming_build_removes_outputs_it_does_not_write(synthetic_csv, postcode_dir):
+    build(synthetic_csv, postcode_dir, streaming=True)
+    assert not os.path.exists(os.path.join(postcode_dir, "postcodes_phf.bin"))
+    assert not os.path.exists(os.path.join(postcode_dir, "shards"))
+
+@pytest.mark.parametrize("seed", range(1, 6))
+def test_perfect_hash_gives_every_postcode_its_own_slot(expected, seed):
+    postcodes = sorted(expected)
+    bucket_count = -(-len(postcodes) // build_postcode_files.PHF_BUCKET_LOAD)
+    placed = build_postcode_files.place_buckets(postcodes, seed, bucket_count)
+    assert placed is not None
+
+    displacements, slot_of, fingerprints = placed
+    assert sorted(slot_of) == list(range(len(postcodes)))
+    for i, p in enumerate(postcodes):
+        h0, h1, h2, fingerprint = phf_hash(p, seed)
+        bucket = h0 % bucket_count
+        d0, d1 = displacements[bucket * 2], displacements[bucket * 2 + 1]
+        slot = phf_slot(h1, h2, d0, d1, len(postcodes))
+        assert slot == slot_of[i]
+        assert fingerprints[slot] == fingerprint
+
+def test_delta_lists_changes_and_fingerprints_every_format(built_dir, tmp_path):
+    new_csv = str(tmp_path / "new.csv")
+    write_csv(new_csv, extra=[
+        ["E", "ZZ1 1AA", "9004", "Changed BRMA"],
+        ["W", "ZZ2 2BB", "9005", "Added BRMA"],
+    ])
+    out = str(tmp_path / "postcodes_delta.json")
+
+    saved = build_postcode_files.CSV_PATH
+    build_postcode_files.CSV_PATH = new_csv
+    try:
+        build_postcode_delta.build_delta(built_dir, out, chunk_size=1000)
+    finally:
+        build_postcode_files.CSV_PATH = saved
+
+    with open(out, encoding="utf-8") as f:
+        delta = json.load(f)
+
+    assert delta["upserts"] == {"ZZ11AA": ["9004", "E"], "ZZ22BB": ["9005", "W"]}
+    assert delta["removed"] == ["ZZ99ZZ"]
+    assert delta["brma_names"] == {"9004": "Changed BRMA", "9005": "Added BRMA"}
+    assert set(delta["base"]) == set(FINGERPRINTED_HEADERS) | {"shards/index.json"}
@@ -0,0 +1,286 @@
+import json
+import os
+import threading
+
+import pytest
+
+# postcode_lookup finds its packaged files through kivy.resources; the
+# tests point find_packaged at a built directory instead, but the import
+# itself still needs kivy
+pytest.importorskip("kivy.resources")
+
+import build_postcode_delta
+import build_postcode_files
+import postcode_lookup as pl
+from conftest import flip_byte, write_csv
+
+FORMATS = list(pl.INDEX_FORMATS) + ["compact"]
+
+# Module state set by loading, restored after every test
+GLOBALS = [
+    "data_bytes", "all_postcodes", "brma_dict", "country_dict", "brma_names",
+    "brma_rev", "brma_name_rev", "country_rev", "index", "overlay",
+]
+
+@pytest.fixture
+def packaged(monkeypatch):
+    """Serve packaged files from a directory: packaged(path)."""
+    for name in GLOBALS:
+        monkeypatch.setattr(pl, name, getattr(pl, name))
+
+    def use(directory):
+        def find_packaged(name):
+            path = os.path.join(directory, name)
+            return path if os.path.exists(path) else None
+        monkeypatch.setattr(pl, "find_packaged", find_packaged)
+
+    return use
+
+def answer(result):
+    return result and (result["brma_code"], result["country"])
+
+def write_delta(base_dir, tmp_path):
+    """A delta that changes ZZ11AA, adds ZZ22BB and removes ZZ99ZZ."""
+    new_csv = str(tmp_path / "new.csv")
+    write_csv(new_csv, extra=[
+        ["E", "ZZ1 1AA", "9004", "Changed BRMA"],
+        ["W", "ZZ2 2BB", "9005", "Added BRMA"],
+    ])
+    out = os.path.join(base_dir, "postcodes_delta.json")
+
+    saved = build_postcode_files.CSV_PATH
+    build_postcode_files.CSV_PATH = new_csv
+    try:
+        build_postcode_delta.build_delta(base_dir, out, chunk_size=1000)
+    finally:
+        build_postcode_files.CSV_PATH = saved
+    return out
+
+# ============================================================
+# Index formats
+# ============================================================
+
+@pytest.mark.parametrize("index_format", FORMATS)
+def test_every_format_finds_every_postcode(packaged, built_dir, expected, index_format):
+    packaged(built_dir)
+    idx = pl.build_postcode_index(index_format=index_format)
+
+    for pcd, want in expected.items():
+        assert answer(pl.lookup_from(idx, pcd)) == want, pcd
+    assert answer(pl.lookup_from(idx, "zz1 1aa")) == ("9001", "E")
+
+    for miss in ["ZZ11AB", "ZZ9 9ZZZ", "A", "", "SW1A1AAX", "ÄB1 0AA"]:
+        assert pl.lookup_from(idx, miss) is None, miss
+
+    pcds = list(expected)[:500] + ["ZZ11AB"]
+    columns = pl.lookup_many_from(idx, pcds)
+    assert list(zip(columns["brma_code"], columns["country"])) == [
+        (expected[p] if p in expected else (None, None)) for p in pcds
+    ]
+    idx.close()
+
+@pytest.mark.parametrize("index_format", [f for f in FORMATS if f != "phf"])
+def test_sorted_formats_complete_prefixes(packaged, built_dir, expected, index_format):
+    packaged(built_dir)
+    idx = pl.build_postcode_index(index_format=index_format)
+
+    prefix = sorted(expected)[100][:4]
+    assert pl.complete_from(idx, prefix, limit=5) == sorted(p for p in expected if p.startswith(prefix))[:5]
+    idx.close()
+
+# ============================================================
+# Corruption
+# ============================================================
+
+@pytest.mark.parametrize("index_format, name", [
+    ("phf", "postcodes_phf.bin"),
+    ("packed", "postcodes_keys.bin"),
+    ("packed", "postcodes_data.bin"),
+    ("fixed", "postcodes_fixed.idx"),
+    ("fixed", "postcodes_data.bin"),
+    ("zidx", "postcodes.zidx"),
+    ("restart", "postcodes.idx"),
+    ("restart", "postcodes_data.bin"),
+    ("shards", "shards"),
+    ("compact", "postcodes_data.bin"),
+])
+def test_flipped_byte_is_caught_not_returned(packaged, postcode_dir, expected, index_format, name):
+    if name == "shards":
+        shard_dir = os.path.join(postcode_dir, "shards")
+        name = "shards/" + max(
+            (f for f in os.listdir(shard_dir) if f.endswith(".bin")),
+            key=lambda f: os.path.getsize(os.path.join(shard_dir, f))
+        )
+    path = os.path.join(postcode_dir, name)
+    flip_byte(path, os.path.getsize(path) // 2)
+    packaged(postcode_dir)
+
+    try:
+        idx = pl.build_postcode_index(index_format=index_format)
+    except ValueError:
+        return
+
+    errors = 0
+    for pcd, want in expected.items():
+        try:
+            result = pl.lookup_from(idx, pcd)
+        except ValueError:
+            errors += 1
+            continue
+        assert answer(result) == want, pcd
+    assert errors
+    idx.close()
+
+# ============================================================
+# Delta overlay
+# ============================================================
+
+@pytest.mark.parametrize("index_format", FORMATS)
+def test_delta_applies_to_the_data_it_was_built_for(packaged, postcode_dir, tmp_path, index_format):
+    write_delta(postcode_dir, tmp_path)
+    packaged(postcode_dir)
+    idx = pl.build_postcode_index(index_format=index_format)
+
+    assert answer(pl.lookup_from(idx, "ZZ11AA")) == ("9004", "E")
+    assert pl.lookup_from(idx, "ZZ22BB")["brma_name"] == "Added BRMA"
+    assert pl.lookup_from(idx, "ZZ99ZZ") is None
+
+@pytest.mark.parametrize("index_format", ["phf", "packed", "zidx", "shards", "compact"])
+@pytest.mark.parametrize("tamper", ["mismatch", "missing"])
+def test_delta_is_ignored_unless_its_fingerprint_matches(packaged, postcode_dir, tmp_path, index_format, tamper):
+    delta_path = write_delta(postcode_dir, tmp_path)
+    with open(delta_path, encoding="utf-8") as f:
+        delta = json.load(f)
+    name = pl.index_filename(index_format)
+    if tamper == "mismatch":
+        delta["base"][name] = "0"
+    else:
+        del delta["base"][name]
+    with open(delta_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f)
+
+    packaged(postcode_dir)
+    idx = pl.build_postcode_index(index_format=index_format)
+
+    assert pl.overlay is None
+    assert answer(pl.lookup_from(idx, "ZZ11AA")) == ("9001", "E")
+    assert pl.lookup_from(idx, "ZZ22BB") is None
+
+def test_delta_is_checked_without_postcodes_idx(packaged, postcode_dir, tmp_path):
+    write_delta(postcode_dir, tmp_path)
+    os.remove(os.path.join(postcode_dir, "postcodes.idx"))
+    packaged(postcode_dir)
+    idx = pl.build_postcode_index(index_format="phf")
+
+    assert answer(pl.lookup_from(idx, "ZZ11AA")) == ("9004", "E")
+
+# ============================================================
+# PostcodeLoader
+# ============================================================
+
+def test_loader_opens_a_random_access_format_once(packaged, built_dir, monkeypatch):
+    packaged(built_dir)
+    opened = []
+    original = pl.MappedPostcodeIndex.open
+    monkeypatch.setattr(pl.MappedPostcodeIndex, "open", classmethod(lambda cls: opened.append(1) or original()))
+
+    loader = pl.PostcodeLoader(index_format="fixed")
+    assert answer(loader.lookup("ZZ11AA")) == ("9001", "E")
+    assert loader.wait(10)
+    assert loader.state == loader.READY
+    assert len(opened) == 1
+
+def test_loader_reports_a_failed_load(packaged, postcode_dir):
+    flip_byte(os.path.join(postcode_dir, "postcodes_phf.bin"), 0)
+    packaged(postcode_dir)
+
+    loader = pl.PostcodeLoader(index_format="phf")
+    loader.start()
+    assert not loader.wait(10)
+    assert loader.state == loader.FAILED
+    assert isinstance(loader.error, ValueError)
+    with pytest.raises(RuntimeError):
+        loader.lookup("ZZ11AA")
+
+def test_compact_loader_answers_from_restart_table_after_failure(packaged, postcode_dir, expected):
+    # Damages the first block only
+    flip_byte(os.path.join(postcode_dir, "postcodes_data.bin"), 0)
+    packaged(postcode_dir)
+
+    loader = pl.PostcodeLoader(index_format="compact")
+    loader.start()
+    assert not loader.wait(10)
+    assert loader.state == loader.FAILED
+
+    last = max(expected)
+    assert answer(loader.lookup(last)) == expected[last]
+    with pytest.raises(ValueError):
+        loader.lookup(min(expected))
+
+def test_closed_loader_lets_go_of_its_index(packaged, built_dir):
+    packaged(built_dir)
+    loader = pl.PostcodeLoader(index_format="packed")
+    loader.start()
+    assert loader.wait(10)
+
+    loader.close()
+    assert loader.state == loader.CLOSED
+    with pytest.raises(RuntimeError):
+        loader.lookup("ZZ11AA")
+
+# ============================================================
+# LRUCache
+# ============================================================
+
+def test_lru_cache_counts_and_evicts_least_recently_used():
+    cache = pl.LRUCache(2)
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        return key.lower()
+
+    assert cache.get_or_load("A", load) == "a"
+    assert cache.get_or_load("B", load) == "b"
+    assert cache.get_or_load("A", load) == "a"
+    assert cache.get_or_load("C", load) == "c"  # evicts B
+    assert cache.get_or_load("B", load) == "b"
+
+    assert loads == ["A", "B", "C", "B"]
+    assert (cache.hits, cache.misses, len(cache)) == (1, 4, 2)
+
+def test_lru_cache_caches_misses():
+    cache = pl.LRUCache(4)
+    assert cache.get_or_load("X", lambda key: None) is None
+    assert cache.get_or_load("X", lambda key: pytest.fail("reloaded")) is None
+    assert cache.hits == 1
+
+def test_lru_cache_drops_a_load_that_started_before_clear():
+    cache = pl.LRUCache(4)
+
+    def load(key):
+        cache.clear()
+        return "stale"
+
+    assert cache.get_or_load("A", load) == "stale"
+    assert len(cache) == 0
+
+def test_lru_cache_does_not_hold_its_lock_while_loading():
+    cache = pl.LRUCache(4)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(key):
+        started.set()
+        release.wait(10)
+        return "slow"
+
+    thread = threading.Thread(target=cache.get_or_load, args=("A", slow))
+    thread.start()
+    assert started.wait(10)
+    # A hit on another key is answered while the slow load is running
+    cache.get_or_load("B", lambda key: "b")
+    assert cache.get_or_load("B", lambda key: pytest.fail("reloaded")) == "b"
+    release.set()
+    thread.join(10)
+    assert cache.get_or_load("A", lambda key: pytest.fail("reloaded")) == "slow"